@@ -1,16 +1,19 @@
 import os
 import json
-import bcrypt
-from datetime import datetime, timedelta
+from datetime import timedelta
 from flask import Flask, request, jsonify
 from flask_jwt_extended import JWTManager, create_access_token
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from accounts import user_accounts, AuthBusyError
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 jwt = JWTManager(app)
 
-# In-memory user storage (for demo purposes)
-users = {}
+# Shared user store (set MONGODB_URI so every instance sees the same users), opened by the
+# first request rather than at cold start
 
 def handler(request):
     """Vercel serverless function handler"""
@@ -34,18 +37,13 @@ def register_user(data):
         if not username or not password:
             return jsonify({'error': 'Username and password required'}), 400
         
-        if username in users:
+        if not user_accounts().register(username, password):
             return jsonify({'error': 'User already exists'}), 400
         
-        # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        users[username] = {
-            'password': hashed_password,
-            'created_at': str(datetime.utcnow())
-        }
-        
         return jsonify({'message': 'User registered successfully'}), 201
-    
+        
+    except AuthBusyError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -58,11 +56,8 @@ def login_user(data):
         if not username or not password:
             return jsonify({'error': 'Username and password required'}), 400
         
-        if username not in users:
-            return jsonify({'error': 'Invalid credentials'}), 401
-        
-        # Check password
-        if bcrypt.checkpw(password.encode('utf-8'), users[username]['password']):
+        # Check credentials
+        if user_accounts().authenticate(username, password) is not None:
             access_token = create_access_token(
                 identity=username,
                 expires_delta=timedelta(hours=24)
@@ -70,6 +65,8 @@ def login_user(data):
             return jsonify({'access_token': access_token}), 200
         else:
             return jsonify({'error': 'Invalid credentials'}), 401
-    
+        
+    except AuthBusyError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
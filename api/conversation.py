@@ -1,12 +1,12 @@
 import os
 import json
-import tempfile
 from flask import Flask, request, jsonify
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from skills.conversation import ConversationAnalyzer
+from skills.registry import registry
+from uploads import Upload
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
@@ -28,19 +28,11 @@ def analyze_conversation(request):
         if 'audio' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
         
-        audio_file = request.files['audio']
-        
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-            audio_file.save(tmp_file.name)
-            temp_path = tmp_file.name
-        
-        # Analyze the audio
-        analyzer = ConversationAnalyzer()
-        result = analyzer.analyze(temp_path)
-        
-        # Clean up temp file
-        os.unlink(temp_path)
+        # Hand the upload buffer straight to the analyzer
+        with Upload(request.files['audio']) as upload:
+            # Shared analyzer survives across warm invocations
+            analyzer = registry.conversation_analyzer()
+            result = analyzer.analyze(upload, get_jwt_identity())
         
         # Format response for frontend compatibility
         if 'error' not in result:
@@ -1,12 +1,12 @@
 import os
 import json
-import tempfile
 from flask import Flask, request, jsonify
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from skills.image import ImageAnalyzer
+from skills.registry import registry
+from uploads import Upload
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
@@ -28,19 +28,11 @@ def analyze_image(request):
         if 'image' not in request.files:
             return jsonify({'error': 'No image file provided'}), 400
         
-        image_file = request.files['image']
-        
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            image_file.save(tmp_file.name)
-            temp_path = tmp_file.name
-        
-        # Analyze the image
-        analyzer = ImageAnalyzer()
-        result = analyzer.analyze(temp_path)
-        
-        # Clean up temp file
-        os.unlink(temp_path)
+        # Hand the upload buffer straight to the analyzer
+        with Upload(request.files['image']) as upload:
+            # Shared analyzer survives across warm invocations
+            analyzer = registry.image_analyzer()
+            result = analyzer.analyze(upload)
         
         return jsonify({
             'status': 'success',
@@ -1,12 +1,12 @@
 import os
 import json
-import tempfile
 from flask import Flask, request, jsonify
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from skills.summarization import DocumentSummarizer
+from skills.registry import registry
+from uploads import Upload
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
@@ -26,25 +26,17 @@ def summarize_content(request):
     try:
         data = request.get_json() if request.is_json else request.form
         
-        summarizer = DocumentSummarizer()
+        # Shared summarizer survives across warm invocations
+        summarizer = registry.document_summarizer()
         
         # Check if it's a URL or file upload
         if 'url' in data:
             url = data.get('url')
             result = summarizer.summarize_url(url)
         elif 'document' in request.files:
-            document_file = request.files['document']
-            
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                document_file.save(tmp_file.name)
-                temp_path = tmp_file.name
-            
-            # Summarize the document
-            result = summarizer.summarize_document(temp_path)
-            
-            # Clean up temp file
-            os.unlink(temp_path)
+            # Summarize the document straight from the upload buffer
+            with Upload(request.files['document']) as upload:
+                result = summarizer.summarize_document(upload)
         else:
             return jsonify({'error': 'No URL or document provided'}), 400
         
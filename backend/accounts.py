@@ -0,0 +1,199 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from skills.memory import SQLiteStore, open_sqlite_store
+
+class AuthBusyError(Exception):
+    """Raised when the password hasher is saturated; retry_after is a hint in seconds"""
+    
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class SQLiteUserStore(SQLiteStore):
+    """User accounts in a local SQLite file (WAL mode), looked up by username"""
+    
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                email TEXT,
+                password_hash BLOB NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        conn.commit()
+    
+    def get(self, username):
+        row = self._connect().execute(
+            "SELECT username, email, password_hash, created_at FROM users WHERE username = ?",
+            (username,)
+        ).fetchone()
+        return dict(row) if row else None
+    
+    def create(self, username, password_hash, email=None):
+        """Insert a user; False when the username is already taken"""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                    (username, email, password_hash, datetime.utcnow().isoformat())
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+    
+    def update_password(self, username, password_hash):
+        with self._connect() as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE username = ?", (password_hash, username))
+
+class MongoUserStore:
+    """User accounts in MongoDB for production deployments, unique on username"""
+    
+    def __init__(self, uri, db_name='ai_playground'):
+        from pymongo import MongoClient
+        
+        self.collection = MongoClient(uri)[db_name]['users']
+        self.collection.create_index('username', unique=True)
+    
+    def get(self, username):
+        return self.collection.find_one({'username': username}, {'_id': 0})
+    
+    def create(self, username, password_hash, email=None):
+        """Insert a user; False when the username is already taken"""
+        from pymongo.errors import DuplicateKeyError
+        
+        try:
+            self.collection.insert_one({
+                'username': username,
+                'email': email,
+                'password_hash': password_hash,
+                'created_at': datetime.utcnow().isoformat()
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+    
+    def update_password(self, username, password_hash):
+        self.collection.update_one({'username': username}, {'$set': {'password_hash': password_hash}})
+
+class PasswordHasher:
+    """bcrypt on a small dedicated pool, so login bursts queue here instead of on the request threads"""
+    
+    def __init__(self, rounds=12, max_workers=2, max_pending=16, timeout=10, retry_after=1):
+        self.rounds = rounds
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt')
+        # Admission control: hashes running plus waiting never exceed this many
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+    
+    def _run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise AuthBusyError('Too many sign-in attempts in progress, please retry shortly', self.retry_after)
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        # The slot is held until bcrypt actually finishes, even if the caller gave up waiting
+        future.add_done_callback(lambda _: self.slots.release())
+        
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise AuthBusyError('Sign-in is taking too long, please retry shortly', self.retry_after)
+    
+    @staticmethod
+    def _hash(password, rounds):
+        import bcrypt
+        return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+    
+    @staticmethod
+    def _check(password, password_hash):
+        import bcrypt
+        return bcrypt.checkpw(password, password_hash)
+    
+    def hash(self, password):
+        return self._run(self._hash, password.encode('utf-8'), self.rounds)
+    
+    def check(self, password, password_hash):
+        if isinstance(password_hash, str):
+            password_hash = password_hash.encode('utf-8')
+        return self._run(self._check, password.encode('utf-8'), password_hash)
+    
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different cost factor than the configured one"""
+        if isinstance(password_hash, bytes):
+            password_hash = password_hash.decode('utf-8')
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+class UserAccounts:
+    """Registration and credential checks over a user store and the shared hasher"""
+    
+    def __init__(self, store, hasher):
+        self.store = store
+        self.hasher = hasher
+    
+    def get(self, username):
+        return self.store.get(username)
+    
+    def register(self, username, password, email=None):
+        """Create a user; False when the username is already taken"""
+        # Checked before hashing so duplicate sign-ups don't spend a bcrypt slot
+        if self.store.get(username) is not None:
+            return False
+        return self.store.create(username, self.hasher.hash(password), email)
+    
+    def authenticate(self, username, password):
+        """The user record when the password matches, otherwise None"""
+        user = self.store.get(username)
+        if user is None or not self.hasher.check(password, user['password_hash']):
+            return None
+        
+        # Upgrade hashes made with an older cost factor; best effort, the login already succeeded
+        if self.hasher.needs_rehash(user['password_hash']):
+            try:
+                self.store.update_password(username, self.hasher.hash(password))
+            except Exception as e:
+                print(f"Error rehashing password for {username}: {e}")
+        return user
+
+def create_user_accounts():
+    """MongoDB when MONGODB_URI is set, otherwise a local SQLite file"""
+    mongo_uri = os.getenv('MONGODB_URI')
+    if mongo_uri:
+        store = MongoUserStore(mongo_uri, os.getenv('MONGODB_DB', 'ai_playground'))
+    else:
+        store = open_sqlite_store(SQLiteUserStore, os.getenv('USER_DB_PATH', 'users.db'))
+    
+    hasher = PasswordHasher(
+        rounds=int(os.getenv('BCRYPT_ROUNDS', '12')),
+        max_workers=int(os.getenv('AUTH_HASH_WORKERS', '2')),
+        max_pending=int(os.getenv('AUTH_MAX_PENDING', '16')),
+        timeout=float(os.getenv('AUTH_HASH_TIMEOUT', '10')),
+        retry_after=int(os.getenv('AUTH_RETRY_AFTER', '1'))
+    )
+    return UserAccounts(store, hasher)
+
+# Opened on first use, so a process that only imports this module (e.g. a spawned pool worker) never touches the DB
+_accounts = None
+_accounts_lock = threading.Lock()
+
+def user_accounts():
+    """Process-wide account store, created on first use"""
+    global _accounts
+    with _accounts_lock:
+        if _accounts is None:
+            _accounts = create_user_accounts()
+        return _accounts
@@ -1,49 +1,201 @@
 import os
-from flask import Flask, request, jsonify
+import time
+import signal
+import threading
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from dotenv import load_dotenv
 from datetime import timedelta
-import bcrypt
-from werkzeug.utils import secure_filename
 import json
 
 # Import skill modules
-from skills.conversation import ConversationAnalyzer
-from skills.image import ImageAnalyzer
-from skills.summarization import DocumentSummarizer
+from skills.registry import registry
+from skills.cache import result_cache
+from skills.httpclient import http_client
+from skills.tracing import tracer, server_timing
+from skills.budget import prompt_budget
+from skills.fingerprint import fingerprint_index
+from jobs import create_job_queue, QueueFullError, DONE, FAILED, FINISHED_STATES
+from uploads import Upload, UploadRequest
+from accounts import user_accounts, AuthBusyError
+from batch import create_batch_runner, BatchError
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+# Multipart files are spooled (and hashed) as they arrive instead of being saved to disk
+app.request_class = UploadRequest
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
-app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 
-# Create upload directory if it doesn't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
 CORS(app)
 jwt = JWTManager(app)
 
-# Simple in-memory user storage (in production, use a database)
-users_db = {}
+# The user store and skill analyzers are built on first use, not at import: spawned PDF
+# workers re-import this module as __mp_main__ when it is run as `python app.py`
+
+# Background workers for submit/poll requests
+job_queue = create_job_queue()
+
+def reload_configuration(signum, frame):
+    """Re-read .env off the signal handler, since retiring analyzers waits for their memory writes"""
+    print("Reloading configuration")
+    threading.Thread(target=registry.reload, name='config-reload', daemon=True).start()
+
+# `kill -HUP <pid>` applies .env changes (diarization mode, thresholds, budgets, API keys) without a restart
+if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGHUP, reload_configuration)
+
+# Optional Server-Timing header listing the traced stages of each request
+TIMING_HEADER = os.getenv('TRACING_TIMING_HEADER', 'false').lower() == 'true'
+
+def collect_metrics():
+    """Gauges read from the shared components at scrape time"""
+    cache = result_cache.stats()
+    jobs = job_queue.stats()
+    outbound = http_client.stats()
+    prompts = prompt_budget.stats()['calls']
+    fingerprints = fingerprint_index.stats()
+    return [
+        ('result_cache_lookups_total', 'counter', 'Result cache lookups since start',
+         [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])]),
+        ('result_cache_entries', 'gauge', 'Entries held in the in-memory cache tier', [({}, cache['entries'])]),
+        ('result_cache_bytes', 'gauge', 'Bytes held in the in-memory cache tier', [({}, cache['bytes'])]),
+        ('skill_jobs_running', 'gauge', 'Background jobs running per skill',
+         [({'skill': skill}, count) for skill, count in jobs['running'].items()]),
+        ('skill_jobs_pending', 'gauge', 'Background jobs waiting per skill',
+         [({'skill': skill}, count) for skill, count in jobs['pending'].items()]),
+        ('outbound_request_p95_ms', 'gauge', 'Recent p95 latency of outbound calls per endpoint',
+         [({'endpoint': endpoint}, stats['p95_ms']) for endpoint, stats in outbound.items()]),
+        ('prompt_tokens_total', 'counter', 'Gemini tokens per prompt call and direction',
+         [({'call': call, 'direction': direction}, stats[f'{direction}_tokens'])
+          for call, stats in prompts.items() for direction in ('input', 'output')]),
+        ('prompt_trimmed_total', 'counter', 'Prompts whose content was trimmed to the token budget',
+         [({'call': call}, stats['trimmed']) for call, stats in prompts.items()]),
+        ('fingerprint_index_entries', 'gauge', 'Recordings held in the near-duplicate index',
+         [({}, fingerprints['entries'])]),
+        ('fingerprint_index_seconds', 'gauge', 'Audio duration covered by the near-duplicate index',
+         [({}, fingerprints['seconds'])])
+    ]
 
-# Initialize skill handlers
-conversation_analyzer = ConversationAnalyzer()
-image_analyzer = ImageAnalyzer()
-document_summarizer = DocumentSummarizer()
+tracer.add_collector(collect_metrics)
+
+@app.before_request
+def start_trace():
+    if tracer.enabled:
+        g.trace_start = time.perf_counter()
+        tracer.begin_request()
+
+@app.after_request
+def finish_trace(response):
+    if tracer.enabled and 'trace_start' in g:
+        elapsed = time.perf_counter() - g.trace_start
+        tracer.observe_request(request.url_rule.rule if request.url_rule else 'unmatched',
+                               request.method, response.status_code, elapsed)
+        timings = tracer.end_request()
+        if TIMING_HEADER:
+            response.headers['Server-Timing'] = server_timing(timings + [('total', elapsed)])
+    return response
 
 # Allowed file extensions
-ALLOWED_AUDIO = {'wav', 'mp3', 'm4a', 'ogg', 'flac'}
+ALLOWED_AUDIO = {'wav', 'mp3', 'm4a', 'ogg', 'flac', 'webm', 'aac', 'mp4'}
 ALLOWED_IMAGES = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
 ALLOWED_DOCS = {'pdf', 'doc', 'docx', 'txt'}
 
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
+def wants_async():
+    """Clients opt into submit/poll with ?mode=async or a Prefer: respond-async header"""
+    return request.args.get('mode') == 'async' or 'respond-async' in request.headers.get('Prefer', '')
+
+def submit_job(skill, fn, *args, cleanup=None):
+    """Queue a skill run and answer 202 with the job id"""
+    try:
+        job_id = job_queue.submit(skill, get_jwt_identity(), fn, *args, cleanup=cleanup)
+    except QueueFullError as e:
+        if cleanup:
+            cleanup()
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'status': 'queued',
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events'
+    }), 202
+
+def job_payload(job):
+    """Public view of a job record"""
+    payload = {
+        'job_id': job['id'],
+        'skill': job['skill'],
+        'status': job['status']
+    }
+    if job['status'] == DONE:
+        payload['result'] = job['result']
+    elif job['status'] == FAILED:
+        payload['error'] = job['error']
+    return payload
+
+def format_conversation_result(result):
+    """Convert analyzer output to the frontend response format"""
+    if 'error' in result:
+        return result
+    
+    formatted_result = {
+        'transcription': result.get('transcript', ''),
+        'speaker_diarization': [],
+        'memory_context': result.get('memory_context', [])
+    }
+    
+    # Convert speaker segments to frontend format
+    speakers = {}
+    for segment in result.get('speaker_segments', []):
+        speaker = segment['speaker']
+        if speaker not in speakers:
+            speakers[speaker] = {
+                'speaker': speaker,
+                'segments': []
+            }
+        speakers[speaker]['segments'].append({
+            'start_time': segment['start_time'],
+            'end_time': segment['end_time'],
+            'text': segment['text']
+        })
+    
+    formatted_result['speaker_diarization'] = list(speakers.values())
+    formatted_result['audio_duration'] = result.get('audio_duration', 0)
+    formatted_result['num_speakers'] = result.get('num_speakers', 1)
+    if 'fingerprint_match' in result:
+        formatted_result['fingerprint_match'] = result['fingerprint_match']
+    if result.get('partial'):
+        formatted_result['partial'] = True
+    
+    print(f"Sending to frontend: {len(formatted_result['speaker_diarization'])} speakers")
+    for speaker in formatted_result['speaker_diarization']:
+        print(f"- {speaker['speaker']}: {len(speaker['segments'])} segments")
+    
+    return formatted_result
+
+def run_conversation_analysis(audio_source, user_id):
+    """Analyze an audio upload and format the result for the frontend"""
+    return format_conversation_result(registry.conversation_analyzer().analyze(audio_source, user_id))
+
+# Batch items are routed to a skill by file type; URLs default to summarization
+batch_runner = create_batch_runner(
+    {
+        'conversation': run_conversation_analysis,
+        'image': lambda source, user_id: registry.image_analyzer().analyze(source),
+        'summarize': lambda source, user_id: registry.document_summarizer().summarize_document(source),
+        'summarize_url': lambda url, user_id: registry.document_summarizer().summarize_url(url)
+    },
+    {'conversation': ALLOWED_AUDIO, 'image': ALLOWED_IMAGES, 'summarize': ALLOWED_DOCS}
+)
+
 @app.route('/', methods=['GET'])
 def root():
     return jsonify({
@@ -54,8 +206,15 @@ def root():
             '/api/register',
             '/api/login',
             '/api/skills/conversation',
+            '/api/skills/conversation/stream',
             '/api/skills/image',
             '/api/skills/summarize',
+            '/api/skills/batch',
+            '/api/jobs/<job_id>',
+            '/api/cache/stats',
+            '/api/http/stats',
+            '/api/prompts/stats',
+            '/metrics',
             '/api/user/profile'
         ]
     }), 200
@@ -75,18 +234,9 @@ def register():
         if not username or not password or not email:
             return jsonify({'error': 'Username, email, and password are required'}), 400
         
-        if username in users_db:
+        if not user_accounts().register(username, password, email):
             return jsonify({'error': 'Username already exists'}), 409
         
-        # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        
-        # Store user
-        users_db[username] = {
-            'password': hashed_password,
-            'email': email
-        }
-        
         # Create access token
         access_token = create_access_token(identity=username)
         
@@ -96,6 +246,9 @@ def register():
             'username': username
         }), 201
         
+    except AuthBusyError as e:
+        # Shed excess sign-ins instead of letting them tie up request threads
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -109,13 +262,8 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Username and password are required'}), 400
         
-        # Check if user exists
-        if username not in users_db:
-            return jsonify({'error': 'Invalid credentials'}), 401
-        
-        # Verify password
-        stored_password = users_db[username]['password']
-        if not bcrypt.checkpw(password.encode('utf-8'), stored_password):
+        # Verify credentials
+        if user_accounts().authenticate(username, password) is None:
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Create access token
@@ -127,6 +275,9 @@ def login():
             'username': username
         }), 200
         
+    except AuthBusyError as e:
+        # Shed excess sign-ins instead of letting them tie up request threads
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -137,63 +288,57 @@ def analyze_conversation():
         if 'audio' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
         
-        audio_file = request.files['audio']
+        upload = Upload(request.files['audio'])
         
-        # Save uploaded file temporarily
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-            audio_file.save(tmp_file.name)
-            temp_path = tmp_file.name
+        if wants_async():
+            return submit_job('conversation', run_conversation_analysis, upload, get_jwt_identity(),
+                              cleanup=upload.close)
         
         # Analyze the audio
-        analyzer = ConversationAnalyzer()
-        result = analyzer.analyze(temp_path)
-        
-        # Clean up temp file
-        import os
-        os.unlink(temp_path)
+        with upload:
+            result = run_conversation_analysis(upload, get_jwt_identity())
         
-        # Format response for frontend compatibility
         if 'error' not in result:
-            formatted_result = {
-                'transcription': result.get('transcript', ''),
-                'speaker_diarization': [],
-                'memory_context': result.get('memory_context', [])
-            }
-            
-            # Convert speaker segments to frontend format
-            speakers = {}
-            for segment in result.get('speaker_segments', []):
-                speaker = segment['speaker']
-                if speaker not in speakers:
-                    speakers[speaker] = {
-                        'speaker': speaker,
-                        'segments': []
-                    }
-                speakers[speaker]['segments'].append({
-                    'start_time': segment['start_time'],
-                    'end_time': segment['end_time'],
-                    'text': segment['text']
-                })
-            
-            formatted_result['speaker_diarization'] = list(speakers.values())
-            formatted_result['audio_duration'] = result.get('audio_duration', 0)
-            formatted_result['num_speakers'] = result.get('num_speakers', 1)
-            
-            print(f"Sending to frontend: {len(formatted_result['speaker_diarization'])} speakers")
-            for speaker in formatted_result['speaker_diarization']:
-                print(f"- {speaker['speaker']}: {len(speaker['segments'])} segments")
-            
             return jsonify({
                 'status': 'success',
-                'result': formatted_result
+                'result': result
             }), 200
         else:
             return jsonify({
                 'status': 'error',
                 'error': result.get('error', 'Unknown error')
             }), 500
-    
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/skills/conversation/stream', methods=['POST'])
+@jwt_required()
+def stream_conversation():
+    """Chunked analysis for long recordings, streamed as JSON lines (or SSE with ?format=sse)"""
+    try:
+        if 'audio' not in request.files:
+            return jsonify({'error': 'No audio file provided'}), 400
+        
+        upload = Upload(request.files['audio'])
+        
+        user_id = get_jwt_identity()
+        use_sse = request.args.get('format') == 'sse'
+        
+        def stream():
+            try:
+                for event in registry.conversation_analyzer().analyze_stream(upload, user_id):
+                    if use_sse:
+                        yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                    else:
+                        yield json.dumps(event) + "\n"
+            finally:
+                # Runs on completion and when the client disconnects
+                upload.close()
+        
+        mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+        return Response(stream(), mimetype=mimetype, headers={'Cache-Control': 'no-cache'})
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -201,8 +346,6 @@ def analyze_conversation():
 @jwt_required()
 def analyze_image():
     try:
-        current_user = get_jwt_identity()
-        
         if 'image' not in request.files:
             return jsonify({'error': 'No image file provided'}), 400
         
@@ -211,15 +354,21 @@ def analyze_image():
             return jsonify({'error': 'No file selected'}), 400
         
         if file and allowed_file(file.filename, ALLOWED_IMAGES):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user}_{filename}")
-            file.save(filepath)
+            upload = Upload(file)
             
-            # Analyze image
-            result = image_analyzer.analyze(filepath)
+            # Optional OCR and object sections are folded into the same model request
+            options = {
+                'include_text': request.form.get('extract_text') == 'true',
+                'include_objects': request.form.get('detect_objects') == 'true'
+            }
+            
+            if wants_async():
+                return submit_job('image', lambda: registry.image_analyzer().analyze(upload, **options),
+                                  cleanup=upload.close)
             
-            # Clean up uploaded file
-            os.remove(filepath)
+            # Analyze image
+            with upload:
+                result = registry.image_analyzer().analyze(upload, **options)
             
             return jsonify({
                 'status': 'success',
@@ -227,7 +376,7 @@ def analyze_image():
             }), 200
         else:
             return jsonify({'error': 'Invalid file format. Supported: PNG, JPG, JPEG, GIF, BMP, WEBP'}), 400
-            
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -235,14 +384,15 @@ def analyze_image():
 @jwt_required()
 def summarize_content():
     try:
-        current_user = get_jwt_identity()
-        
         # Check if it's a URL submission
         if request.is_json:
             data = request.get_json()
             url = data.get('url')
             if url:
-                result = document_summarizer.summarize_url(url)
+                if wants_async():
+                    return submit_job('summarize', registry.document_summarizer().summarize_url, url)
+                
+                result = registry.document_summarizer().summarize_url(url)
                 return jsonify({
                     'status': 'success',
                     'result': result
@@ -259,15 +409,15 @@ def summarize_content():
             return jsonify({'error': 'No file selected'}), 400
         
         if file and allowed_file(file.filename, ALLOWED_DOCS):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user}_{filename}")
-            file.save(filepath)
+            upload = Upload(file)
             
-            # Summarize document
-            result = document_summarizer.summarize_document(filepath)
+            if wants_async():
+                return submit_job('summarize', registry.document_summarizer().summarize_document, upload,
+                                  cleanup=upload.close)
             
-            # Clean up uploaded file
-            os.remove(filepath)
+            # Summarize document
+            with upload:
+                result = registry.document_summarizer().summarize_document(upload)
             
             return jsonify({
                 'status': 'success',
@@ -275,19 +425,105 @@ def summarize_content():
             }), 200
         else:
             return jsonify({'error': 'Invalid file format. Supported: PDF, DOC, DOCX, TXT'}), 400
-            
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/skills/batch', methods=['POST'])
+@jwt_required()
+def analyze_batch():
+    """Many files (or a zip of them) or a list of URLs, results streamed as JSON lines as items finish"""
+    try:
+        if request.is_json:
+            data = request.get_json()
+            urls = data.get('urls')
+            if not isinstance(urls, list) or not urls:
+                return jsonify({'error': 'A non-empty list of urls is required'}), 400
+            items = batch_runner.collect_urls(urls, data.get('skill'))
+        else:
+            files = [file for key in request.files for file in request.files.getlist(key) if file.filename]
+            if not files:
+                return jsonify({'error': 'No files or URLs provided'}), 400
+            items = batch_runner.collect_files(files, request.form.get('skill'))
+        
+        user_id = get_jwt_identity()
+        
+        def stream():
+            # Closing the generator on disconnect cancels the items that have not started
+            for event in batch_runner.run(items, user_id):
+                yield json.dumps(event) + "\n"
+        
+        return Response(stream(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache'})
+        
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    job = job_queue.get(job_id, get_jwt_identity())
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job_payload(job)), 200
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+def job_events(job_id):
+    owner = get_jwt_identity()
+    
+    def stream():
+        last_status = None
+        while True:
+            job = job_queue.wait(job_id, owner, last_status)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job not found or expired'})}\n\n"
+                return
+            
+            if job['status'] == last_status:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {job['status']}\ndata: {json.dumps(job_payload(job))}\n\n"
+            
+            if job['status'] in FINISHED_STATES:
+                return
+            last_status = job['status']
+    
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    return jsonify(result_cache.stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(tracer.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/http/stats', methods=['GET'])
+@jwt_required()
+def http_stats():
+    """Outbound call latency per endpoint (LemonFox, URL fetches)"""
+    return jsonify(http_client.stats()), 200
+
+@app.route('/api/prompts/stats', methods=['GET'])
+@jwt_required()
+def prompt_stats():
+    """Token usage and budgets per Gemini prompt call"""
+    return jsonify(prompt_budget.stats()), 200
+
 @app.route('/api/user/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     try:
         current_user = get_jwt_identity()
-        if current_user in users_db:
+        user = user_accounts().get(current_user)
+        if user is not None:
             return jsonify({
                 'username': current_user,
-                'email': users_db[current_user]['email']
+                'email': user['email']
             }), 200
         return jsonify({'error': 'User not found'}), 404
     except Exception as e:
@@ -0,0 +1,225 @@
+import os
+import time
+import zipfile
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from skills.httpclient import http_client
+from uploads import Upload, spool_upload
+
+class BatchError(Exception):
+    """Raised when a batch request is malformed or over its limits"""
+
+class BatchItem:
+    """One input of a batch: an upload or a URL, and the skill that will process it"""
+    
+    def __init__(self, index, name, skill, source):
+        self.id = index
+        self.name = name
+        self.skill = skill
+        self.source = source
+    
+    @property
+    def is_url(self):
+        return isinstance(self.source, str)
+    
+    @property
+    def key(self):
+        """Identical inputs for the same skill share one analysis"""
+        return (self.skill, self.source if self.is_url else self.source.sha256)
+    
+    def close(self):
+        if not self.is_url:
+            self.source.close()
+
+class BatchRunner:
+    """Runs batch items on a shared worker pool and yields per-item events as they finish"""
+    
+    def __init__(self, handlers, extensions, max_workers=4, max_items=500, max_bytes=500 * 1024 * 1024):
+        # handlers: skill -> fn(source, user_id); a '<skill>_url' handler takes URLs directly
+        self.handlers = handlers
+        self.extensions = extensions
+        self.max_workers = max_workers
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch')
+    
+    def skill_for(self, filename, skill=None):
+        """The requested skill, or the one whose file types include this extension"""
+        if skill:
+            return skill
+        extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else None
+        for name, extensions in self.extensions.items():
+            if extension in extensions:
+                return name
+        return None
+    
+    def collect_files(self, files, skill=None):
+        """Batch items from uploaded files; .zip archives are expanded into their members"""
+        items = []
+        total = 0
+        try:
+            for file_storage in files:
+                upload = Upload(file_storage)
+                if upload.extension != 'zip':
+                    items.append(BatchItem(len(items), upload.filename, self.skill_for(upload.filename, skill), upload))
+                    total += upload.size
+                else:
+                    with upload:
+                        total = self._expand_archive(upload, skill, items, total)
+                if len(items) > self.max_items:
+                    raise BatchError(f'A batch may contain at most {self.max_items} items')
+                if total > self.max_bytes:
+                    raise BatchError(f'A batch may contain at most {self.max_bytes} bytes')
+        except Exception:
+            for item in items:
+                item.close()
+            raise
+        return items
+    
+    def _expand_archive(self, upload, skill, items, total):
+        try:
+            archive = zipfile.ZipFile(upload.open())
+        except zipfile.BadZipFile:
+            raise BatchError(f'{upload.filename} is not a valid zip archive')
+        
+        with archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name or info.filename.startswith('__MACOSX/'):
+                    continue
+                if len(items) >= self.max_items:
+                    raise BatchError(f'A batch may contain at most {self.max_items} items')
+                
+                # Sizes are enforced on the bytes actually read, not the member headers
+                with archive.open(info) as member:
+                    try:
+                        member_upload = spool_upload(iter(lambda: member.read(1024 * 1024), b''), name,
+                                                     max_size=self.max_bytes - total)
+                    except ValueError:
+                        raise BatchError(f'A batch may contain at most {self.max_bytes} bytes')
+                items.append(BatchItem(len(items), member_upload.filename, self.skill_for(name, skill), member_upload))
+                total += member_upload.size
+        return total
+    
+    def collect_urls(self, urls, skill=None):
+        """Batch items from a list of URLs or {"url", "skill"} objects; web pages default to summarize"""
+        if len(urls) > self.max_items:
+            raise BatchError(f'A batch may contain at most {self.max_items} items')
+        
+        items = []
+        for entry in urls:
+            url, item_skill = (entry.get('url'), entry.get('skill')) if isinstance(entry, dict) else (entry, None)
+            if not isinstance(url, str) or urlsplit(url).scheme not in ('http', 'https'):
+                raise BatchError(f'Invalid URL in batch: {url!r}')
+            path = urlsplit(url).path
+            item_skill = item_skill or skill or self.skill_for(path) or 'summarize'
+            items.append(BatchItem(len(items), url, item_skill, url))
+        return items
+    
+    def _process(self, item, user_id):
+        """Run one item; URLs without a URL handler are downloaded first"""
+        if item.is_url and f'{item.skill}_url' in self.handlers:
+            return self.handlers[f'{item.skill}_url'](item.source, user_id)
+        
+        handler = self.handlers[item.skill]
+        if not item.is_url:
+            return handler(item.source, user_id)
+        
+        with self.download(item.source) as upload:
+            return handler(upload, user_id)
+    
+    def download(self, url):
+        """Fetch a URL into a spooled upload, bounded by the batch byte limit"""
+        response = http_client.get(url, endpoint='batch.fetch', stream=True)
+        try:
+            response.raise_for_status()
+            name = os.path.basename(urlsplit(url).path) or 'download'
+            
+            # Refuse a declared oversize body before reading it; spool_upload checks each chunk as it arrives
+            length = response.headers.get('Content-Length', '')
+            if length.isdigit() and int(length) > self.max_bytes:
+                raise ValueError(f'{name} is larger than {self.max_bytes} bytes')
+            return spool_upload(response.iter_content(1024 * 1024), name, max_size=self.max_bytes)
+        finally:
+            response.close()
+    
+    def run(self, items, user_id):
+        """Generator of event dicts: accepted, one item event per input, then done"""
+        start = time.perf_counter()
+        counts = {'success': 0, 'error': 0}
+        
+        # Group duplicates behind the first occurrence; extra copies are released right away
+        groups = {}
+        events = []
+        for item in items:
+            if item.skill not in self.extensions:
+                events.append(self._event(item, 'error', error=f'Unsupported file type: {item.name}'))
+                item.close()
+                continue
+            group = groups.setdefault(item.key, [])
+            if group:
+                item.close()
+            group.append(item)
+        
+        yield {'type': 'accepted', 'items': len(items), 'unique': len(groups)}
+        for event in events:
+            counts['error'] += 1
+            yield event
+        
+        pending = list(groups.values())
+        running = {}
+        try:
+            while pending or running:
+                # A window of in-flight items per batch keeps one batch from flooding the pool
+                while pending and len(running) < self.max_workers:
+                    group = pending.pop(0)
+                    future = self.executor.submit(self._timed, group[0], user_id)
+                    future.add_done_callback(lambda _, primary=group[0]: primary.close())
+                    running[future] = group
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    group = running.pop(future)
+                    status, payload, seconds = future.result()
+                    for item in group:
+                        extra = {'duplicate_of': group[0].id} if item is not group[0] else {}
+                        counts[status] += 1
+                        yield self._event(item, status, elapsed_seconds=round(seconds, 3), **payload, **extra)
+        finally:
+            # Client went away or the batch finished: drop work that has not started
+            for future in running:
+                future.cancel()
+            for group in pending:
+                group[0].close()
+        
+        yield {
+            'type': 'done',
+            'succeeded': counts['success'],
+            'failed': counts['error'],
+            'elapsed_seconds': round(time.perf_counter() - start, 3)
+        }
+    
+    def _timed(self, item, user_id):
+        start = time.perf_counter()
+        try:
+            result = self._process(item, user_id)
+            if isinstance(result, dict) and 'error' in result:
+                return 'error', {'error': result['error']}, time.perf_counter() - start
+            return 'success', {'result': result}, time.perf_counter() - start
+        except Exception as e:
+            print(f"Error processing batch item {item.name}: {e}")
+            return 'error', {'error': str(e)}, time.perf_counter() - start
+    
+    def _event(self, item, status, **fields):
+        return {'type': 'item', 'id': item.id, 'name': item.name, 'skill': item.skill, 'status': status, **fields}
+
+def create_batch_runner(handlers, extensions):
+    """Build the batch runner from environment configuration"""
+    return BatchRunner(
+        handlers,
+        extensions,
+        max_workers=int(os.getenv('BATCH_WORKERS', '4')),
+        max_items=int(os.getenv('BATCH_MAX_ITEMS', '500')),
+        max_bytes=int(os.getenv('BATCH_MAX_BYTES', str(500 * 1024 * 1024)))
+    )
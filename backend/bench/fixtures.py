@@ -0,0 +1,145 @@
+"""Synthetic inputs for the pipeline benchmarks, generated deterministically from a seed"""
+import os
+import random
+
+import numpy as np
+
+WORDS = (
+    "analysis budget customer delivery engine forecast growth hardware invoice journey kernel "
+    "latency market network operation platform quarter revenue server timeline update vendor "
+    "workflow account balance contract design estimate feature hiring inventory launch meeting "
+    "policy quality release schedule strategy support team testing training usage"
+).split()
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+def paragraph(rng, sentences=6):
+    return ' '.join(sentence(rng, rng.randint(8, 16)) for _ in range(sentences))
+
+def make_audio(path, minutes, sample_rate=44100, seed=0):
+    """Two synthetic voices taking turns, with pauses, written block by block"""
+    import soundfile as sf
+    
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * sample_rate)
+    voices = [(120.0, [1.0, 0.6, 0.4, 0.25]), (210.0, [1.0, 0.3, 0.5, 0.1])]
+    
+    with sf.SoundFile(path, 'w', samplerate=sample_rate, channels=1, subtype='PCM_16', format='WAV') as out:
+        written = 0
+        speaker = 0
+        while written < total:
+            turn = min(int(rng.uniform(3, 8) * sample_rate), total - written)
+            t = np.arange(turn) / sample_rate
+            f0, harmonics = voices[speaker]
+            # Slow pitch drift and ~4 Hz syllable envelope make it look like speech to VAD/MFCC
+            pitch = f0 * (1 + 0.05 * np.sin(2 * np.pi * 0.3 * t))
+            phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+            voice = sum(weight * np.sin((k + 1) * phase) for k, weight in enumerate(harmonics))
+            envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None) ** 0.5
+            block = 0.2 * voice * envelope + 0.003 * rng.standard_normal(turn)
+            
+            pause = min(int(rng.uniform(0.2, 0.8) * sample_rate), total - written - turn)
+            block = np.concatenate([block, 0.003 * rng.standard_normal(max(pause, 0))])
+            out.write(block.astype(np.float32))
+            written += len(block)
+            speaker = 1 - speaker
+    return path
+
+def make_pdf(path, pages, seed=0, lines_per_page=40):
+    """Minimal multi-page PDF with Helvetica text, written by hand so no PDF writer is needed"""
+    rng = random.Random(seed)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = ' '.join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    font_id = 3 + 2 * pages
+    
+    for page in range(pages):
+        lines = [f"Section {page + 1}"] + [sentence(rng, 10) for _ in range(lines_per_page)]
+        text = ' T* '.join(f"({line}) Tj" for line in lines)
+        content = f"BT /F1 10 Tf 12 TL 50 760 Td {text} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * page} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>")
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    
+    parts = [b"%PDF-1.4\n"]
+    offsets = []
+    position = len(parts[0])
+    for number, body in enumerate(objects, 1):
+        chunk = f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+        offsets.append(position)
+        parts.append(chunk)
+        position += len(chunk)
+    
+    xref = [f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"]
+    xref.extend(f"{offset:010d} 00000 n \n" for offset in offsets)
+    xref.append(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n")
+    parts.append(''.join(xref).encode('latin-1'))
+    
+    with open(path, 'wb') as f:
+        f.write(b''.join(parts))
+    return path
+
+def make_docx(path, paragraphs, seed=0):
+    from docx import Document
+    
+    rng = random.Random(seed)
+    doc = Document()
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            doc.add_heading(f"Chapter {i // 20 + 1}", level=1)
+        doc.add_paragraph(paragraph(rng))
+    table = doc.add_table(rows=50, cols=4)
+    for row in table.rows:
+        for cell in row.cells:
+            cell.text = rng.choice(WORDS)
+    doc.save(path)
+    return path
+
+def make_html(paragraphs, seed=0):
+    """Large article page with the script/style/navigation noise real pages carry"""
+    rng = random.Random(seed)
+    body = []
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            body.append(f"<h2>Part {i // 10 + 1}</h2>")
+        body.append(f"<p>{paragraph(rng)}</p>")
+        if i % 25 == 0:
+            body.append("<script>window.metrics = {" + ','.join(f'"k{j}": {j}' for j in range(50)) + "};</script>")
+    nav = ''.join(f'<li><a href="/page/{i}">{rng.choice(WORDS)}</a></li>' for i in range(200))
+    return (f"<html><head><title>Benchmark article</title><style>{'p { margin: 0 }' * 200}</style></head>"
+            f"<body><nav><ul>{nav}</ul></nav><article>{''.join(body)}</article></body></html>")
+
+def make_image(path, width, height, seed=0):
+    """Photo-like image (gradients plus noise) that compresses about as badly as a real photo"""
+    from PIL import Image
+    
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    pixels = np.stack([
+        128 + 100 * np.sin(x / 97.0),
+        128 + 100 * np.cos(y / 131.0),
+        128 + 100 * np.sin((x + y) / 211.0)
+    ], axis=-1) + rng.normal(0, 20, (height, width, 3))
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path)
+    return path
+
+def build_fixtures(directory, audio_minutes, pdf_pages, docx_paragraphs, image_sizes, audio_rate=44100):
+    """Generate every fixture once; existing files are reused between runs"""
+    os.makedirs(directory, exist_ok=True)
+    
+    def cached(name, build):
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            build(path)
+        return path
+    
+    return {
+        'audio': {minutes: cached(f"conversation_{minutes:g}min_{audio_rate}.wav",
+                                  lambda p, m=minutes: make_audio(p, m, audio_rate)) for minutes in audio_minutes},
+        'pdf': {pages: cached(f"document_{pages}p.pdf", lambda p, n=pages: make_pdf(p, n)) for pages in pdf_pages},
+        'docx': cached(f"document_{docx_paragraphs}par.docx", lambda p: make_docx(p, docx_paragraphs)),
+        'image': {size: cached(f"photo_{size[0]}x{size[1]}.png", lambda p, s=size: make_image(p, *s))
+                  for size in image_sizes}
+    }
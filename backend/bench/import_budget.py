@@ -0,0 +1,88 @@
+"""Import-time budget check for the serverless functions in api/
+
+Each function module is imported in a fresh interpreter and an empty working
+directory, the way a cold start does it. The check fails when an import takes
+longer than the budget, pulls in a heavy dependency that should only load
+inside the code path using it, or writes files such as a database.
+
+    python backend/bench/import_budget.py [--budget SECONDS] [module ...]
+
+backend/tests/test_import_budget.py runs the same check as part of the tests.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+API_DIR = os.path.join(ROOT, 'api')
+
+# Every serverless function; each is a cold start of its own
+FUNCTIONS = ['auth', 'conversation', 'image', 'summarize']
+
+# Seconds one import may take, overridable per run
+DEFAULT_BUDGET = float(os.getenv('IMPORT_BUDGET_SECONDS', '1.0'))
+
+# Modules that must not be imported until a request needs them
+HEAVY_MODULES = [
+    'google.generativeai', 'librosa', 'sklearn', 'pydub', 'soundfile', 'soxr',
+    'webrtcvad', 'PyPDF2', 'docx', 'bs4', 'pymongo'
+]
+
+# Runs in the child interpreter; prints the import time, the heavy modules it loaded and the files it wrote
+PROBE = """
+import os, sys, time, json, importlib.util
+path, heavy = sys.argv[1], json.loads(sys.argv[2])
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('cold_start_probe', path)
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'loaded': [name for name in heavy if name in sys.modules],
+                  'created': sorted(os.listdir('.'))}))
+"""
+
+def measure(module_path, repeats=3):
+    """Best-of-N cold import time of one function module"""
+    best = None
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory() as cwd:
+            output = subprocess.run(
+                [sys.executable, '-c', PROBE, module_path, json.dumps(HEAVY_MODULES)],
+                capture_output=True, text=True, cwd=cwd, check=True
+            ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+def measure_function(name, repeats=3):
+    """Best-of-N cold import of one api/ function by name"""
+    return measure(os.path.join(API_DIR, f'{name}.py'), repeats)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=FUNCTIONS)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    
+    failures = []
+    for name in args.modules:
+        result = measure_function(name, args.repeats)
+        status = 'ok'
+        if result['seconds'] > args.budget:
+            status = 'over budget'
+        if result['loaded']:
+            status = f"eager imports: {', '.join(result['loaded'])}"
+        if result['created']:
+            status = f"wrote files: {', '.join(result['created'])}"
+        if status != 'ok':
+            failures.append(name)
+        print(f"api/{name}.py: {result['seconds'] * 1000:.0f} ms (budget {args.budget * 1000:.0f} ms) {status}")
+    
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
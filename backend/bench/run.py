@@ -0,0 +1,290 @@
+"""End-to-end benchmark of the skill pipelines against local Gemini and LemonFox stand-ins
+
+Runs ConversationAnalyzer, DocumentSummarizer and ImageAnalyzer on generated fixtures and
+writes a JSON report with per-stage timings, peak memory and throughput per concurrency level,
+so runs on two commits can be diffed.
+
+    python backend/bench/run.py --audio-minutes 1,10 --pdf-pages 300 --concurrency 1,4 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from fixtures import build_fixtures, make_html
+from stubs import StubModel, StubServer
+
+class StageTimer:
+    """Wall time of selected analyzer methods, collected across threads"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+    
+    def wrap(self, obj, method, stage):
+        original = getattr(obj, method)
+        
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        
+        setattr(obj, method, timed)
+    
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples[stage].append(seconds)
+    
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+    
+    def summary(self):
+        with self.lock:
+            report = {}
+            for stage, values in self.samples.items():
+                values = sorted(values)
+                report[stage] = {
+                    'count': len(values),
+                    'total_s': round(sum(values), 4),
+                    'mean_s': round(sum(values) / len(values), 4),
+                    'p50_s': round(values[len(values) // 2], 4),
+                    'p95_s': round(values[min(len(values) - 1, int(0.95 * len(values)))], 4),
+                    'max_s': round(values[-1], 4)
+                }
+            return report
+
+def rss_bytes():
+    """Current resident set size, from /proc where available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is a high-water mark (KB on Linux, bytes on macOS), the best fallback there is
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+class MemorySampler:
+    """Peak RSS over a block, sampled from a background thread (no tracemalloc slowdown)"""
+    
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.stop = threading.Event()
+        self.baseline = self.peak = 0
+    
+    def _sample(self):
+        while not self.stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+    
+    def __enter__(self):
+        self.baseline = self.peak = rss_bytes()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+def run_scenario(name, fn, inputs, concurrency, timer, work_units=None, unit_name=None, warmup=1):
+    """Run fn over inputs with a thread pool and report wall time, throughput, stages and memory"""
+    # Untimed requests first, so one-off costs (lazy imports, JIT, pools) stay out of the numbers
+    for _ in range(warmup):
+        fn(inputs[0])
+    timer.reset()
+    with MemorySampler() as memory:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fn, inputs))
+        wall = time.perf_counter() - start
+    
+    errors = [result['error'] for result in results if isinstance(result, dict) and 'error' in result]
+    scenario = {
+        'name': name,
+        'concurrency': concurrency,
+        'requests': len(inputs),
+        'errors': len(errors),
+        'wall_s': round(wall, 4),
+        'throughput_rps': round(len(inputs) / wall, 4) if wall else None,
+        'peak_rss_mb': round(memory.peak / 2 ** 20, 1),
+        'rss_growth_mb': round((memory.peak - memory.baseline) / 2 ** 20, 1),
+        'stages': timer.summary()
+    }
+    if work_units:
+        scenario[f'{unit_name}_per_s'] = round(work_units * len(inputs) / wall, 2) if wall else None
+    if errors:
+        scenario['first_error'] = str(errors[0])[:300]
+    
+    print(f"{name} x{concurrency}: {wall:.2f}s, {len(errors)} errors", file=sys.stderr)
+    return scenario
+
+def build_analyzers(args, stub, workdir, timer):
+    """Analyzers wired to the stand-ins, with result caching and fingerprint reuse off so every request does the work"""
+    os.environ['LEMONFOX_URL'] = args.lemonfox_url or f"{stub.url}/v1/audio/transcriptions"
+    os.environ.setdefault('LEMONFOX_API_KEY', 'bench')
+    os.environ['MEMORY_DB_PATH'] = os.path.join(workdir, 'memory.db')
+    os.environ['DIARIZATION_MODE'] = args.diarization
+    os.environ.pop('MONGODB_URI', None)
+    
+    from skills.registry import registry
+    from skills.cache import ResultCache
+    from skills.fingerprint import FingerprintIndex
+    from skills.conversation import ConversationAnalyzer
+    from skills.summarization import DocumentSummarizer
+    from skills.image import ImageAnalyzer
+    
+    model = StubModel(args.model_latency)
+    no_cache = ResultCache(max_entries=0, max_bytes=0)
+    analyzers = {
+        'conversation': ConversationAnalyzer(),
+        'summarize': DocumentSummarizer(),
+        'image': ImageAnalyzer()
+    }
+    for analyzer in analyzers.values():
+        analyzer.cache = no_cache
+        registry.set_model(analyzer.model_name, model)
+    
+    # Repeated fixtures would otherwise be reused as near-duplicates instead of transcribed and diarized
+    conversation = analyzers['conversation']
+    conversation.fingerprints = FingerprintIndex(max_entries=0)
+    timer.wrap(conversation, 'load_audio', 'decode')
+    timer.wrap(conversation, 'transcribe_audio', 'transcribe')
+    timer.wrap(conversation, 'assign_speakers', 'assign_speakers')
+    timer.wrap(conversation.acoustic_diarizer, 'turns', 'acoustic_turns')
+    timer.wrap(conversation, 'analyze', 'total')
+    
+    summarizer = analyzers['summarize']
+    timer.wrap(summarizer, 'extract_text_from_pdf', 'extract_pdf')
+    timer.wrap(summarizer, 'extract_text_from_docx', 'extract_docx')
+    timer.wrap(summarizer, 'extract_text_from_url', 'extract_html')
+    timer.wrap(summarizer, 'summarize_chunks', 'map')
+    timer.wrap(summarizer, 'generate_all_summaries', 'reduce')
+    timer.wrap(summarizer, 'summarize_document', 'total')
+    timer.wrap(summarizer, 'summarize_url', 'total')
+    
+    image = analyzers['image']
+    timer.wrap(image, 'load_image', 'decode')
+    timer.wrap(image, 'prepare_image', 'prepare')
+    timer.wrap(image, 'analyze', 'total')
+    
+    return analyzers, model
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=BACKEND_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def number_list(value, cast=float):
+    return [cast(item) for item in value.split(',') if item]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pipelines', default='conversation,summarize,image')
+    parser.add_argument('--audio-minutes', type=number_list, default=[1, 10])
+    parser.add_argument('--audio-rate', type=int, default=44100)
+    parser.add_argument('--pdf-pages', type=lambda v: number_list(v, int), default=[300])
+    parser.add_argument('--docx-paragraphs', type=int, default=2000)
+    parser.add_argument('--html-paragraphs', type=int, default=3000)
+    parser.add_argument('--image-sizes', default='1920x1080,6000x4000')
+    parser.add_argument('--concurrency', type=lambda v: number_list(v, int), default=[1, 4])
+    parser.add_argument('--rounds', type=int, default=1, help='requests per worker at each concurrency level')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed requests before each scenario')
+    parser.add_argument('--model-latency', type=float, default=0.2, help='seconds per stub Gemini call')
+    parser.add_argument('--transcribe-latency', type=float, default=0.5, help='seconds per stub LemonFox call')
+    parser.add_argument('--lemonfox-url', help='use an external LemonFox stand-in instead of the built-in one')
+    parser.add_argument('--diarization', default='acoustic', choices=['gemini', 'acoustic', 'hybrid'])
+    parser.add_argument('--fixtures-dir', default=os.path.join(tempfile.gettempdir(), 'skill-bench-fixtures'))
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help="keep the analyzers' own logging")
+    args = parser.parse_args()
+    
+    pipelines = set(args.pipelines.split(','))
+    image_sizes = [tuple(int(n) for n in size.split('x')) for size in args.image_sizes.split(',') if size]
+    
+    print("Generating fixtures...", file=sys.stderr)
+    fixtures = build_fixtures(args.fixtures_dir, args.audio_minutes if 'conversation' in pipelines else [],
+                              args.pdf_pages if 'summarize' in pipelines else [], args.docx_paragraphs,
+                              image_sizes if 'image' in pipelines else [], args.audio_rate)
+    pages = {'/article.html': make_html(args.html_paragraphs)}
+    
+    timer = StageTimer()
+    scenarios = []
+    workdir = tempfile.mkdtemp(prefix='skill-bench-')
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    
+    with StubServer(args.transcribe_latency, pages) as stub, quiet:
+        analyzers, model = build_analyzers(args, stub, workdir, timer)
+        
+        for concurrency in args.concurrency:
+            count = concurrency * args.rounds
+            
+            if 'conversation' in pipelines:
+                analyzer = analyzers['conversation']
+                for minutes, path in fixtures['audio'].items():
+                    scenarios.append(run_scenario(
+                        f"conversation/{minutes:g}min", lambda p: analyzer.analyze(p, 'bench'), [path] * count,
+                        concurrency, timer, warmup=args.warmup, work_units=minutes * 60, unit_name='audio_seconds'))
+            
+            if 'summarize' in pipelines:
+                summarizer = analyzers['summarize']
+                for page_count, path in fixtures['pdf'].items():
+                    scenarios.append(run_scenario(
+                        f"extract_pdf/{page_count}p", summarizer.extract_text_from_pdf, [path] * count,
+                        concurrency, timer, warmup=args.warmup, work_units=page_count, unit_name='pages'))
+                    scenarios.append(run_scenario(
+                        f"summarize_pdf/{page_count}p", summarizer.summarize_document, [path] * count,
+                        concurrency, timer, warmup=args.warmup, work_units=page_count, unit_name='pages'))
+                scenarios.append(run_scenario(
+                    f"summarize_docx/{args.docx_paragraphs}par", summarizer.summarize_document,
+                    [fixtures['docx']] * count, concurrency, timer, warmup=args.warmup))
+                scenarios.append(run_scenario(
+                    f"summarize_url/{args.html_paragraphs}par", summarizer.summarize_url,
+                    [f"{stub.url}/article.html"] * count, concurrency, timer, warmup=args.warmup))
+            
+            if 'image' in pipelines:
+                image_analyzer = analyzers['image']
+                for (width, height), path in fixtures['image'].items():
+                    scenarios.append(run_scenario(
+                        f"image/{width}x{height}", lambda p: image_analyzer.analyze(p, True, True), [path] * count,
+                        concurrency, timer, warmup=args.warmup, work_units=width * height / 1e6, unit_name='megapixels'))
+    
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose')},
+            'model_calls': model.calls,
+            'transcription_calls': stub.requests
+        },
+        'scenarios': scenarios
+    }
+    
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Local stand-ins for Gemini and LemonFox with configurable latency"""
+import re
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+class StubModel:
+    """Answers the prompts the analyzers send with well-formed canned output after a fixed delay"""
+    
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+    
+    def generate_content(self, contents, **kwargs):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        
+        prompt = contents[0] if isinstance(contents, list) else contents
+        if 'JSON object with these string fields' in prompt:
+            fields = re.findall(r'^- "(\w+)":', prompt, flags=re.M)
+            return StubResponse(json.dumps({field: f"Stub {field.replace('_', ' ')}." for field in fields}))
+        if 'JSON object mapping each speaker label' in prompt:
+            speakers = sorted(set(re.findall(r'^(Speaker \d+):', prompt, flags=re.M)))
+            return StubResponse(json.dumps({speaker: f"Role {i + 1}" for i, speaker in enumerate(speakers)}))
+        if 'JSON array of' in prompt:
+            count = int(re.search(r'JSON array of (\d+)', prompt).group(1))
+            return StubResponse(json.dumps([f"Conversation summary {i + 1}" for i in range(count)]))
+        if 'speaker diarization expert' in prompt:
+            transcript = prompt.split('Transcript to analyze:', 1)[1].split('Instructions:', 1)[0]
+            sentences = [s.strip() + '.' for s in transcript.split('.') if s.strip()]
+            segments = [{'speaker': f"Speaker {i % 2 + 1}", 'text': s} for i, s in enumerate(sentences)]
+            return StubResponse(json.dumps({'segments': segments}))
+        return StubResponse("Stub summary. " * 40)
+
+class StubServer:
+    """LemonFox transcription endpoint plus static HTML pages, served from a local thread"""
+    
+    def __init__(self, latency=0.0, pages=None, words_per_second=2.5):
+        self.latency = latency
+        self.pages = pages or {}
+        self.words_per_second = words_per_second
+        self.requests = 0
+        
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, *args):
+                pass
+            
+            def reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def do_GET(self):
+                page = stub.pages.get(self.path)
+                if page is None:
+                    return self.reply(404, b'not found', 'text/plain')
+                self.reply(200, page.encode('utf-8'), 'text/html; charset=utf-8')
+            
+            def do_POST(self):
+                # Drain the multipart upload; its size gives the duration of the 16kHz 16-bit WAV
+                length = int(self.headers.get('Content-Length', 0))
+                remaining = length
+                while remaining:
+                    remaining -= len(self.rfile.read(min(remaining, 1024 * 1024)))
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                self.reply(200, json.dumps(stub.transcription(length / 32000.0)).encode('utf-8'),
+                           'application/json')
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    
+    def transcription(self, duration):
+        """verbose_json response with evenly spaced word timings"""
+        count = max(1, int(duration * self.words_per_second))
+        step = duration / count
+        words = [{'word': f"word{i % 50}{'.' if i % 12 == 11 else ''}", 'start': round(i * step, 3),
+                  'end': round((i + 0.8) * step, 3)} for i in range(count)]
+        return {'text': ' '.join(word['word'] for word in words), 'words': words}
+    
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
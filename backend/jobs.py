@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED_STATES = {DONE, FAILED}
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are already waiting for a worker"""
+
+class JobQueue:
+    """Bounded worker pool for skill jobs with per-skill limits and a TTL result store"""
+
+    def __init__(self, max_workers=8, skill_limits=None, result_ttl=600, max_pending=100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='skill-job')
+        self.skill_limits = skill_limits or {}
+        self.default_limit = max_workers
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+
+        self.jobs = {}
+        self.running = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def submit(self, skill, owner, fn, *args, cleanup=None, **kwargs):
+        """Enqueue a skill job and return its id right away"""
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'skill': skill,
+            'owner': owner,
+            'status': QUEUED,
+            'result': None,
+            'error': None,
+            'created_at': time.time(),
+            'finished_at': None,
+            'task': (fn, args, kwargs, cleanup)
+        }
+
+        with self.lock:
+            self._purge_expired()
+            waiting = sum(len(q) for q in self.pending.values())
+            if waiting >= self.max_pending:
+                raise QueueFullError('Too many jobs queued, please retry later')
+
+            self.jobs[job_id] = job
+            if self.running.get(skill, 0) < self.skill_limits.get(skill, self.default_limit):
+                self.running[skill] = self.running.get(skill, 0) + 1
+                self.executor.submit(self._run, job_id)
+            else:
+                # Wait for a slot of this skill to free up
+                self.pending.setdefault(skill, deque()).append(job_id)
+
+        return job_id
+
+    def _run(self, job_id):
+        """Execute one job and hand its skill slot to the next waiting job"""
+        with self.lock:
+            job = self.jobs[job_id]
+            job['status'] = RUNNING
+            fn, args, kwargs, cleanup = job.pop('task')
+            self.changed.notify_all()
+
+        status, result, error = DONE, None, None
+        try:
+            result = fn(*args, **kwargs)
+            if isinstance(result, dict) and 'error' in result:
+                status, error = FAILED, result['error']
+        except Exception as e:
+            print(f"Error in {job['skill']} job {job_id}: {e}")
+            status, error = FAILED, str(e)
+        finally:
+            if cleanup:
+                try:
+                    cleanup()
+                except Exception as e:
+                    print(f"Error cleaning up job {job_id}: {e}")
+
+        with self.lock:
+            job.update(status=status, result=result, error=error, finished_at=time.time())
+
+            skill = job['skill']
+            waiting = self.pending.get(skill)
+            if waiting:
+                self.executor.submit(self._run, waiting.popleft())
+            else:
+                self.running[skill] -= 1
+            self.changed.notify_all()
+
+    def _purge_expired(self):
+        """Drop finished jobs whose results were never fetched (lock must be held)"""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job['finished_at'] is not None and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def _snapshot(self, job):
+        return {key: value for key, value in job.items() if key != 'task'}
+
+    def get(self, job_id, owner):
+        """Return the job state; finished results are removed once fetched"""
+        with self.lock:
+            self._purge_expired()
+            job = self.jobs.get(job_id)
+            if job is None or job['owner'] != owner:
+                return None
+            if job['status'] in FINISHED_STATES:
+                del self.jobs[job_id]
+            return self._snapshot(job)
+
+    def wait(self, job_id, owner, last_status=None, timeout=15):
+        """Block until the job leaves last_status or the timeout passes"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['owner'] != owner:
+                return None
+            self.changed.wait_for(lambda: job['status'] != last_status, timeout=timeout)
+        if job['status'] in FINISHED_STATES:
+            return self.get(job_id, owner)
+        return self._snapshot(job)
+
+    def stats(self):
+        """Running and queued job counts per skill"""
+        with self.lock:
+            return {
+                'running': dict(self.running),
+                'pending': {skill: len(waiting) for skill, waiting in self.pending.items()}
+            }
+
+def create_job_queue():
+    """Build the job queue from environment configuration"""
+    return JobQueue(
+        max_workers=int(os.getenv('JOB_WORKERS', '8')),
+        skill_limits={
+            'conversation': int(os.getenv('JOB_LIMIT_CONVERSATION', '2')),
+            'image': int(os.getenv('JOB_LIMIT_IMAGE', '4')),
+            'summarize': int(os.getenv('JOB_LIMIT_SUMMARIZE', '4'))
+        },
+        result_ttl=int(os.getenv('JOB_RESULT_TTL', '600')),
+        max_pending=int(os.getenv('JOB_MAX_PENDING', '100'))
+    )
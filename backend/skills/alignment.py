@@ -0,0 +1,109 @@
+import numpy as np
+
+from .vad import speech_frames, frame_length, FRAME_MS, BLOCK_FRAMES
+
+def words_from_response(result):
+    """Word timestamps from a verbose transcription response, when the API provides them"""
+    words = result.get('words') or []
+    if not words:
+        # Some responses only nest words inside segments
+        words = [word for segment in result.get('segments') or [] for word in segment.get('words') or []]
+    
+    return [{
+        'word': word.get('word', '').strip(),
+        'start_time': float(word.get('start', 0)),
+        'end_time': float(word.get('end', 0))
+    } for word in words if word.get('word', '').strip()]
+
+def energy_frames(samples, sample_rate=16000, frame_ms=FRAME_MS):
+    """Speech flags from frame RMS energy, used when VAD finds nothing"""
+    frame_len = frame_length(sample_rate, frame_ms)
+    num_frames = len(samples) // frame_len
+    if num_frames == 0:
+        return np.zeros(0, dtype=bool)
+    
+    rms = np.empty(num_frames, dtype=np.float32)
+    for first in range(0, num_frames, BLOCK_FRAMES):
+        count = min(BLOCK_FRAMES, num_frames - first)
+        frames = np.asarray(samples[first * frame_len:(first + count) * frame_len]).reshape(count, frame_len)
+        rms[first:first + count] = np.sqrt(np.mean(frames ** 2, axis=1))
+    return rms > max(np.percentile(rms, 30) * 1.5, 1e-4)
+
+def estimate_word_timestamps(words, samples, sample_rate=16000, flags=None):
+    """Spread words over the speech regions only, weighted by word length"""
+    if not words:
+        return []
+    
+    if flags is None:
+        flags = speech_frames(samples, sample_rate)
+    if not flags.any():
+        flags = energy_frames(samples, sample_rate)
+    
+    frame_seconds = FRAME_MS / 1000
+    duration = len(samples) / sample_rate
+    if not flags.any():
+        # No speech detected at all, fall back to the whole recording
+        flags = np.ones(max(1, int(duration / frame_seconds)), dtype=bool)
+    
+    # Speech time elapsed at the end of every frame
+    speech_clock = np.cumsum(flags) * frame_seconds
+    total_speech = speech_clock[-1]
+    
+    # Position of each word boundary in speech time, proportional to characters spoken
+    weights = np.array([len(word) + 1 for word in words], dtype=np.float64)
+    boundaries = np.concatenate(([0.0], np.cumsum(weights))) / weights.sum() * total_speech
+    
+    # Map speech time back to wall-clock time through the speech frames
+    boundaries = np.maximum(boundaries, 1e-9)
+    frame_index = np.searchsorted(speech_clock, boundaries, side='left')
+    frame_index = np.minimum(frame_index, len(flags) - 1)
+    frame_start = frame_index * frame_seconds
+    into_frame = frame_seconds - (speech_clock[frame_index] - boundaries)
+    wall_times = np.round(np.clip(frame_start + np.clip(into_frame, 0, frame_seconds), 0, duration), 3)
+    
+    return [{
+        'word': word,
+        'start_time': float(wall_times[i]),
+        'end_time': float(wall_times[i + 1])
+    } for i, word in enumerate(words)]
+
+def assign_words_to_turns(word_timestamps, turns):
+    """Group timed words into speaker segments using acoustic (start, end, speaker) turns"""
+    if not word_timestamps or not turns:
+        return []
+    
+    # Each word belongs to the turn containing its midpoint
+    midpoints = np.array([(w['start_time'] + w['end_time']) / 2 for w in word_timestamps])
+    turn_ends = np.array([end for _, end, _ in turns])
+    turn_index = np.minimum(np.searchsorted(turn_ends, midpoints, side='left'), len(turns) - 1)
+    speakers = np.array([speaker for _, _, speaker in turns])[turn_index]
+    
+    # Consecutive words from the same speaker form one segment
+    change = np.flatnonzero(speakers[1:] != speakers[:-1]) + 1
+    bounds = np.concatenate(([0], change, [len(word_timestamps)]))
+    return [{
+        'speaker': str(speakers[begin]),
+        'start_time': word_timestamps[begin]['start_time'],
+        'end_time': word_timestamps[end - 1]['end_time'],
+        'text': ' '.join(w['word'] for w in word_timestamps[begin:end])
+    } for begin, end in zip(bounds[:-1], bounds[1:])]
+
+def align_segments(segments, word_timestamps):
+    """Assign real start/end times to diarized text segments using word timestamps"""
+    if not segments or not word_timestamps:
+        return []
+    
+    # The diarized text may not match the transcript word for word, so scale its counts
+    counts = np.array([max(1, len(segment.get('text', '').split())) for segment in segments], dtype=np.float64)
+    ends = np.round(np.cumsum(counts) / counts.sum() * len(word_timestamps)).astype(int)
+    starts = np.concatenate(([0], ends[:-1]))
+    ends = np.maximum(ends, starts + 1)
+    starts = np.minimum(starts, len(word_timestamps) - 1)
+    ends = np.minimum(ends, len(word_timestamps))
+    
+    return [{
+        'speaker': segment.get('speaker', 'Speaker 1'),
+        'start_time': word_timestamps[start]['start_time'],
+        'end_time': word_timestamps[end - 1]['end_time'],
+        'text': segment.get('text', '')
+    } for segment, start, end in zip(segments, starts, ends)]
@@ -0,0 +1,239 @@
+import io
+import os
+import shutil
+import weakref
+import tempfile
+import subprocess
+import numpy as np
+
+from .sources import open_source, source_path
+from .tracing import tracer
+from .vad import speech_frames
+
+# Every analyzer stage works on 16kHz mono audio
+TARGET_SAMPLE_RATE = 16000
+
+# Frames read per block when downmixing and resampling in-process
+BLOCK_FRAMES = 64 * 1024
+
+# Recordings longer than this are decoded into a memory-mapped temp file instead of RAM; 0 keeps all in memory
+MEMMAP_SECONDS = float(os.getenv('AUDIO_MEMMAP_SECONDS', '600'))
+
+# Decoder for containers libsndfile cannot read (m4a, webm, aac, mp4)
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+
+class DecodedAudio:
+    """16kHz mono float32 audio decoded once per request, in RAM or memory-mapped for long recordings"""
+    
+    def __init__(self, samples, sample_rate=TARGET_SAMPLE_RATE, wav_bytes=None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.duration = len(samples) / sample_rate if sample_rate else 0
+        self._wav_bytes = wav_bytes
+        self._speech_flags = None
+    
+    def slice(self, start, end):
+        """View of the samples between two sample offsets"""
+        return DecodedAudio(self.samples[start:end], self.sample_rate)
+    
+    def speech_flags(self):
+        """VAD flags for the whole recording, computed once and shared by every stage"""
+        if self._speech_flags is None:
+            self._speech_flags = speech_frames(self.samples, self.sample_rate)
+        return self._speech_flags
+    
+    @property
+    def is_mapped(self):
+        """Samples are paged in from a temp file rather than held in RAM"""
+        return isinstance(self.samples, np.memmap)
+    
+    @property
+    def wav_bytes(self):
+        """16-bit PCM WAV encoding of the buffer, used for transcription uploads"""
+        if self._wav_bytes is not None:
+            return self._wav_bytes
+        import soundfile as sf
+        buffer = io.BytesIO()
+        sf.write(buffer, self.samples, self.sample_rate, format='WAV', subtype='PCM_16')
+        
+        # Memory-mapped recordings are uploaded in chunks, so an encoding of all of it is never kept
+        if self.is_mapped:
+            return buffer.getvalue()
+        self._wav_bytes = buffer.getvalue()
+        return self._wav_bytes
+    
+    def save_wav(self, path):
+        """Write the 16-bit PCM WAV encoding straight to a file"""
+        if self._wav_bytes is not None:
+            with open(path, 'wb') as f:
+                f.write(self._wav_bytes)
+            return
+        import soundfile as sf
+        sf.write(path, self.samples, self.sample_rate, format='WAV', subtype='PCM_16')
+
+class AudioFormat:
+    """Container, encoding and layout read from a file header"""
+    
+    def __init__(self, container, subtype, sample_rate, channels, frames):
+        self.container = container
+        self.subtype = subtype
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames = frames
+    
+    @property
+    def is_target(self):
+        """Already 16kHz mono 16-bit PCM WAV, so the bytes can be used as they are"""
+        return (self.container == 'WAV' and self.subtype == 'PCM_16'
+                and self.sample_rate == TARGET_SAMPLE_RATE and self.channels == 1)
+
+def probe_audio(source):
+    """Header of an input soundfile can decode, or None for formats that need ffmpeg (m4a, webm, ...)"""
+    import soundfile as sf
+    try:
+        with open_source(source) as stream:
+            info = sf.info(stream)
+    except Exception:
+        return None
+    return AudioFormat(info.format, info.subtype, info.samplerate, info.channels, info.frames)
+
+def resampled_blocks(stream, audio_format):
+    """16kHz mono float32 blocks, downmixed and resampled as they are read"""
+    import soundfile as sf
+    
+    resampler = None
+    if audio_format.sample_rate != TARGET_SAMPLE_RATE:
+        import soxr
+        resampler = soxr.ResampleStream(audio_format.sample_rate, TARGET_SAMPLE_RATE, 1, dtype='float32')
+    
+    with sf.SoundFile(stream) as audio_file:
+        for block in audio_file.blocks(blocksize=BLOCK_FRAMES, dtype='float32', always_2d=True):
+            mono = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+            yield resampler.resample_chunk(mono) if resampler else mono
+    if resampler:
+        yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+def read_resampled(stream, audio_format):
+    """Resampled blocks collected into one preallocated 16kHz buffer"""
+    # Frame counts from compressed headers can be approximate, so the buffer grows if needed
+    expected = int(np.ceil(audio_format.frames * TARGET_SAMPLE_RATE / audio_format.sample_rate))
+    samples = np.empty(expected + BLOCK_FRAMES, dtype=np.float32)
+    written = 0
+    
+    def append(chunk):
+        nonlocal samples, written
+        if written + len(chunk) > len(samples):
+            samples = np.resize(samples, max(written + len(chunk), 2 * len(samples)))
+        samples[written:written + len(chunk)] = chunk
+        written += len(chunk)
+    
+    for block in resampled_blocks(stream, audio_format):
+        append(block)
+    return samples[:written]
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def map_blocks(blocks, memmap_frames=0):
+    """Sample blocks written to a temp file and memory-mapped, so RAM holds only the pages in use;
+    buffers of at most memmap_frames are read back into RAM instead"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.f32') as tmp_file:
+        path = tmp_file.name
+        try:
+            for block in blocks:
+                tmp_file.write(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+        except BaseException:
+            tmp_file.close()
+            remove_file(path)
+            raise
+    
+    length = os.path.getsize(path) // 4
+    if length == 0 or length <= memmap_frames:
+        samples = np.fromfile(path, dtype=np.float32)
+        remove_file(path)
+        return samples
+    samples = np.memmap(path, dtype=np.float32, mode='r', shape=(length,))
+    
+    # The mapping outlives the unlinked file on POSIX; elsewhere the file goes with the last view
+    try:
+        os.remove(path)
+    except OSError:
+        weakref.finalize(samples, remove_file, path)
+    return samples
+
+def framed_blocks(samples, n_fft, hop_length, block_frames):
+    """Zero-padded sample blocks whose center=False STFT frames are the whole signal's center=True frames"""
+    num_frames = 1 + len(samples) // hop_length
+    half = n_fft // 2
+    for first in range(0, num_frames, block_frames):
+        last = min(first + block_frames, num_frames)
+        start = first * hop_length - half
+        end = (last - 1) * hop_length + n_fft - half
+        block = np.asarray(samples[max(start, 0):min(end, len(samples))], dtype=np.float32)
+        if start < 0 or end > len(samples):
+            block = np.pad(block, (max(0, -start), max(0, end - len(samples))))
+        yield block
+
+def decode_with_soundfile(source, audio_format):
+    """In-process decode; conforming WAVs keep their original bytes for the transcription upload"""
+    import soundfile as sf
+    with open_source(source) as stream:
+        # Long recordings are paged in from disk by every stage instead of held in RAM
+        if MEMMAP_SECONDS and audio_format.frames > MEMMAP_SECONDS * audio_format.sample_rate:
+            return DecodedAudio(map_blocks(resampled_blocks(stream, audio_format)), TARGET_SAMPLE_RATE)
+        if audio_format.is_target:
+            wav_bytes = stream.read()
+            samples, _ = sf.read(io.BytesIO(wav_bytes), dtype='float32')
+            return DecodedAudio(samples, TARGET_SAMPLE_RATE, wav_bytes)
+        return DecodedAudio(read_resampled(stream, audio_format), TARGET_SAMPLE_RATE)
+
+def ffmpeg_blocks(path):
+    """16kHz mono float32 blocks piped out of an ffmpeg subprocess as it decodes"""
+    command = [FFMPEG_BINARY, '-nostdin', '-loglevel', 'error', '-i', path,
+               '-f', 's16le', '-ac', '1', '-ar', str(TARGET_SAMPLE_RATE), '-']
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for data in iter(lambda: process.stdout.read(BLOCK_FRAMES * 2), b''):
+            yield np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+        if process.wait() != 0:
+            raise RuntimeError(process.stderr.read().decode(errors='replace').strip())
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+def decode_with_ffmpeg(source):
+    """Decode through ffmpeg, spilling to a memory-mapped temp file so long recordings never sit in RAM"""
+    if shutil.which(FFMPEG_BINARY) is None:
+        raise RuntimeError(f"{FFMPEG_BINARY} not found")
+    # The output length is unknown until ffmpeg finishes, so short recordings are read back into RAM
+    memmap_frames = int(MEMMAP_SECONDS * TARGET_SAMPLE_RATE) if MEMMAP_SECONDS else float('inf')
+    return DecodedAudio(map_blocks(ffmpeg_blocks(source_path(source)), memmap_frames), TARGET_SAMPLE_RATE)
+
+@tracer.traced('audio.decode')
+def decode_audio(source):
+    """Decode any audio format to 16kHz mono in a single pass"""
+    # Decoders are imported on first use to keep serverless cold starts short
+    audio_format = probe_audio(source)
+    if audio_format is not None:
+        try:
+            return decode_with_soundfile(source, audio_format)
+        except Exception as e:
+            print(f"Error decoding audio with soundfile, falling back to ffmpeg: {e}")
+    
+    # Containers libsndfile cannot read are streamed out of an ffmpeg subprocess
+    try:
+        return decode_with_ffmpeg(source)
+    except Exception as e:
+        print(f"Error decoding audio with ffmpeg, falling back to librosa: {e}")
+    
+    # Last resort without ffmpeg: audioread decodes the whole file into RAM, so memory grows with its length
+    import librosa
+    with open_source(source) as stream:
+        samples, sr = librosa.load(stream, sr=TARGET_SAMPLE_RATE, mono=True)
+    return DecodedAudio(samples.astype(np.float32), sr)
@@ -0,0 +1,182 @@
+import os
+import re
+import threading
+
+# Summaries and image analysis run on gemini-2.5-flash, which counts its thinking tokens
+# against max_output_tokens; those caps add this much on top of the visible output
+THINKING_HEADROOM = 8192
+
+# (input, output) token budgets per call; input covers the variable content, not the prompt
+# template, and None leaves that side unbounded. Override with PROMPT_BUDGET_<CALL>=input:output
+DEFAULT_BUDGETS = {
+    'summary': (8000, 2048 + THINKING_HEADROOM),
+    'brief_summary': (2500, 256 + THINKING_HEADROOM),
+    'key_entities': (2500, 1024 + THINKING_HEADROOM),
+    'chunk_notes': (4000, 1024 + THINKING_HEADROOM),
+    'conversation_summary': (250, 48),
+    'conversation_summaries': (250, 512),
+    'diarization': (24000, None),
+    'speaker_roles': (400, 128),
+    'image_analysis': (None, 4096 + THINKING_HEADROOM),
+    'image_text': (None, 2048 + THINKING_HEADROOM),
+    'image_objects': (None, 1024 + THINKING_HEADROOM)
+}
+
+TRUNCATION_MARKER = "...[content truncated]"
+
+class TokenEstimator:
+    """Local token counts from a characters-per-token ratio calibrated on the usage Gemini reports"""
+    
+    def __init__(self, chars_per_token=4.0, weight=0.1):
+        self.chars_per_token = chars_per_token
+        self.weight = weight
+        self.lock = threading.Lock()
+    
+    def count(self, text):
+        return self.tokens_for(len(text)) if text else 0
+    
+    def tokens_for(self, chars):
+        return int(chars / self.chars_per_token) + 1
+    
+    def chars_for(self, tokens):
+        return int(tokens * self.chars_per_token)
+    
+    def observe(self, chars, tokens):
+        """Fold one (prompt characters, prompt tokens) pair into the moving average"""
+        if chars < 200 or not tokens:
+            return
+        ratio = min(8.0, max(1.5, chars / tokens))
+        with self.lock:
+            self.chars_per_token += self.weight * (ratio - self.chars_per_token)
+
+class CallStats:
+    __slots__ = ('calls', 'input_tokens', 'output_tokens', 'trimmed')
+    
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.trimmed = 0
+
+class PromptBudget:
+    """Per-call token budgets: trims prompt content to fit, caps output and records usage"""
+    
+    def __init__(self, budgets=None, estimator=None):
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.estimator = estimator or TokenEstimator()
+        self.lock = threading.Lock()
+        self.calls = {}
+    
+    def configure(self, budgets):
+        """Replace the overrides; usage counters and the token estimate carry over"""
+        self.budgets = dict(DEFAULT_BUDGETS, **budgets)
+    
+    def limits(self, call):
+        return self.budgets.get(call, (None, None))
+    
+    def count(self, text):
+        return self.estimator.count(text)
+    
+    def fits(self, call, text):
+        max_tokens = self.limits(call)[0]
+        return max_tokens is None or self.count(text) <= max_tokens
+    
+    def fit(self, call, text, max_tokens=None, marker=TRUNCATION_MARKER):
+        """Content trimmed to the call's input budget: whitespace first, then cut at a paragraph or sentence"""
+        max_tokens = max_tokens or self.limits(call)[0]
+        if max_tokens is None or self.count(text) <= max_tokens:
+            return text
+        
+        # Extracted PDF and HTML text often carries runs of spaces and blank lines
+        text = re.sub(r'[ \t]+', ' ', text)
+        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text).strip()
+        if self.count(text) <= max_tokens:
+            return text
+        
+        stats = self._stats(call)
+        with self.lock:
+            stats.trimmed += 1
+        max_chars = self.estimator.chars_for(max_tokens) - len(marker)
+        cut = text[:max_chars]
+        boundary = max(cut.rfind('\n\n'), cut.rfind('. '))
+        if boundary > max_chars * 0.9:
+            cut = cut[:boundary + 1]
+        return cut + marker
+    
+    def generate(self, model, call, prompt, **kwargs):
+        """generate_content with the call's output cap, recording token usage for the call"""
+        max_output = self.limits(call)[1]
+        if max_output is not None:
+            config = dict(kwargs.pop('generation_config', None) or {})
+            config.setdefault('max_output_tokens', max_output)
+            kwargs['generation_config'] = config
+        
+        response = model.generate_content(prompt, **kwargs)
+        self.record(call, prompt, response)
+        return response
+    
+    def record(self, call, prompt, response):
+        usage = getattr(response, 'usage_metadata', None)
+        input_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        
+        # Without usage metadata (older SDKs, stand-in models) the local estimate is recorded
+        texts = [prompt] if isinstance(prompt, str) else [part for part in prompt if isinstance(part, str)]
+        if input_tokens:
+            if isinstance(prompt, str):
+                self.estimator.observe(len(prompt), input_tokens)
+        else:
+            input_tokens = sum(self.count(text) for text in texts)
+        if not output_tokens:
+            try:
+                output_tokens = self.count(response.text or '')
+            except Exception:
+                output_tokens = 0
+        
+        stats = self._stats(call)
+        with self.lock:
+            stats.calls += 1
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+    
+    def _stats(self, call):
+        stats = self.calls.get(call)
+        if stats is None:
+            with self.lock:
+                stats = self.calls.setdefault(call, CallStats())
+        return stats
+    
+    def stats(self):
+        """Token usage per call plus the current calibration"""
+        with self.lock:
+            calls = {
+                call: {
+                    'calls': stats.calls,
+                    'input_tokens': stats.input_tokens,
+                    'output_tokens': stats.output_tokens,
+                    'trimmed': stats.trimmed,
+                    'budget': {'input': self.limits(call)[0], 'output': self.limits(call)[1]}
+                }
+                for call, stats in self.calls.items()
+            }
+        return {'chars_per_token': round(self.estimator.chars_per_token, 3), 'calls': calls}
+
+def budgets_from_env():
+    """PROMPT_BUDGET_<CALL>=input:output overrides; an empty side keeps the default, 0 removes the bound"""
+    budgets = {}
+    for call, (default_input, default_output) in DEFAULT_BUDGETS.items():
+        value = os.getenv(f'PROMPT_BUDGET_{call.upper()}')
+        if not value:
+            continue
+        input_part, _, output_part = value.partition(':')
+        budgets[call] = (
+            (int(input_part) or None) if input_part else default_input,
+            (int(output_part) or None) if output_part else default_output
+        )
+    return budgets
+
+# Shared by every analyzer so usage and calibration cover all Gemini calls in the process
+prompt_budget = PromptBudget(
+    budgets_from_env(),
+    TokenEstimator(chars_per_token=float(os.getenv('PROMPT_CHARS_PER_TOKEN', '4.0')))
+)
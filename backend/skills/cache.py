@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+class ResultCache:
+    """Content-addressed LRU cache for skill results with an optional on-disk tier"""
+    
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, cache_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        
+        # Values are stored serialized so callers always get their own copy
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(skill, content_hash, prompt_version, model_name):
+        """Build a cache key from the input identity and everything that shapes the output"""
+        raw = f"{skill}|{content_hash}|{prompt_version}|{model_name}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+    
+    def _store(self, key, payload):
+        """Insert into the memory tier and evict least recently used entries (lock must be held)"""
+        if key in self.entries:
+            self.current_bytes -= len(self.entries.pop(key))
+        self.entries[key] = payload
+        self.current_bytes += len(payload)
+        
+        while self.entries and (len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+            self.evictions += 1
+    
+    def get(self, key):
+        """Return a cached result or None"""
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(payload)
+        
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                    payload = f.read()
+                with self.lock:
+                    self._store(key, payload)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return json.loads(payload)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error reading cache entry {key}: {e}")
+        
+        with self.lock:
+            self.misses += 1
+        return None
+    
+    def set(self, key, value):
+        """Cache a result in memory and, when configured, on disk"""
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            print(f"Result is not cacheable: {e}")
+            return
+        
+        with self.lock:
+            self._store(key, payload)
+        
+        if self.cache_dir:
+            try:
+                path = self._disk_path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Error writing cache entry {key}: {e}")
+    
+    def stats(self):
+        """Hit/miss counters and memory tier usage"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.current_bytes
+            }
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalize_url(url):
+    """Canonical form of a URL so trivially different spellings share a cache entry"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+def is_cacheable(result):
+    """Only complete, successful results are worth reusing"""
+    return isinstance(result, dict) and 'error' not in result and not result.get('partial')
+
+# Shared by every analyzer in the process
+result_cache = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', '256')),
+    max_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    cache_dir=os.getenv('RESULT_CACHE_DIR') or None
+)
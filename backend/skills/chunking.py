@@ -0,0 +1,43 @@
+import hashlib
+
+# Extractors separate pages with a form feed so chunks can follow page boundaries
+PAGE_BREAK = '\f'
+
+# Coarsest boundary first: pages, then sections/paragraphs, then lines
+SEPARATORS = [PAGE_BREAK, '\n\n', '\n']
+
+def split_units(text, max_chars, separators=SEPARATORS):
+    """Break text into pieces no longer than max_chars, splitting on the coarsest boundary available"""
+    if len(text) <= max_chars:
+        return [text]
+    if not separators:
+        # A single line longer than a chunk is cut at the limit
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+    
+    units = []
+    for part in text.split(separators[0]):
+        units.extend(split_units(part, max_chars, separators[1:]))
+    return units
+
+def chunk_stream(texts, max_chars):
+    """Pack consecutive pages/sections into chunks of up to max_chars, yielding each as soon as it is full"""
+    current = []
+    size = 0
+    for text in texts:
+        for unit in split_units(text, max_chars):
+            if not unit.strip():
+                continue
+            if current and size + len(unit) + 1 > max_chars:
+                yield '\n'.join(current)
+                current, size = [], 0
+            current.append(unit)
+            size += len(unit) + 1
+    if current:
+        yield '\n'.join(current)
+
+def chunk_text(text, max_chars):
+    """Pack the pages/sections of one text into chunks of up to max_chars"""
+    return list(chunk_stream([text], max_chars))
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -1,43 +1,116 @@
 import os
-import numpy as np
-import google.generativeai as genai
-from pydub import AudioSegment
-import librosa
-import soundfile as sf
-from sklearn.cluster import KMeans
-import tempfile
-import requests
 import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from .audio import DecodedAudio, decode_audio, probe_audio
+from .cache import result_cache, is_cacheable
+from .httpclient import http_client
+from .tracing import tracer
+from .budget import prompt_budget
+from .sources import source_hash
+from .registry import registry
+from .memory import create_memory_store, MemoryWriter, DEFAULT_USER
+from .vad import split_on_silence
+from .alignment import words_from_response, estimate_word_timestamps, align_segments, assign_words_to_turns
+from .diarization import AcousticDiarizer, DISTANCE_THRESHOLD
+from .fingerprint import fingerprint, fingerprint_index
+
+# Diarization modes that cluster voices locally instead of asking Gemini to split the transcript
+ACOUSTIC_MODES = {'acoustic', 'hybrid'}
 
 class ConversationAnalyzer:
+    # Bump when prompts or result shape change so cached results are not reused
+    PROMPT_VERSION = 'conversation-v2'
+    
     def __init__(self):
-        # Initialize Gemini for analysis and diarization
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+        # Gemini for analysis and diarization, built lazily by the shared registry
+        self.model_name = 'gemini-1.5-flash'
+        
+        # Shared result cache keyed on the upload bytes
+        self.cache = result_cache
+        
+        # LemonFox API configuration, called through the shared pooled client
+        self.lemonfox_url = os.getenv("LEMONFOX_URL", "https://api.lemonfox.ai/v1/audio/transcriptions")
+        self.http = http_client
+        
+        # Chunked mode transcribes pieces of long recordings concurrently
+        self.chunk_seconds = float(os.getenv('STREAM_CHUNK_SECONDS', '30'))
+        self.stream_lookahead = int(os.getenv('STREAM_LOOKAHEAD', '2'))
+        self.transcribe_concurrency = int(os.getenv('TRANSCRIBE_CONCURRENCY', '4'))
+        self.transcription_executor = ThreadPoolExecutor(
+            max_workers=self.transcribe_concurrency,
+            thread_name_prefix='transcribe'
+        )
+        
+        # Longer recordings are uploaded in pause-aligned chunks, so no request body holds all of one
+        self.upload_seconds = float(os.getenv('TRANSCRIBE_UPLOAD_SECONDS', '300'))
         
-        # LemonFox API configuration
-        self.lemonfox_api_key = os.getenv('LEMONFOX_API_KEY')
-        self.lemonfox_url = "https://api.lemonfox.ai/v1/audio/transcriptions"
+        # 'gemini' labels speakers from the transcript text, 'acoustic' clusters voices locally,
+        # 'hybrid' clusters locally and only asks Gemini to name the roles
+        self.diarization_mode = os.getenv('DIARIZATION_MODE', 'gemini')
+        self.label_roles = os.getenv('DIARIZATION_ROLE_LABELS', 'true').lower() == 'true'
+        self.acoustic_diarizer = AcousticDiarizer(
+            distance_threshold=float(os.getenv('DIARIZATION_THRESHOLD', str(DISTANCE_THRESHOLD))),
+            max_speakers=int(os.getenv('DIARIZATION_MAX_SPEAKERS', '0')) or None
+        )
         
-        # Memory storage for last 5 conversations
-        self.memory_file = 'conversation_memory.json'
-        self.conversation_memory = self.load_memory()
+        # Token budgets for every Gemini prompt, with usage recorded per call
+        self.budget = prompt_budget
+        
+        # Recent recordings by audio fingerprint, so re-encoded, trimmed or extended uploads
+        # reuse the transcript instead of sending the same audio to LemonFox again
+        self.fingerprints = fingerprint_index
+        self.min_overlap_seconds = float(os.getenv('FINGERPRINT_MIN_OVERLAP', '10'))
+        self.near_duplicate_share = float(os.getenv('FINGERPRINT_NEAR_DUPLICATE', '0.95'))
+        
+        # Per-user conversation memory; recent summaries feed diarization context
+        self.memory = create_memory_store()
+        
+        # Memory summaries only matter for later requests, so they are written behind
+        self.memory_writer = MemoryWriter(
+            self.memory,
+            self.generate_summaries,
+            max_queue=int(os.getenv('MEMORY_QUEUE_SIZE', '100')),
+            batch_size=int(os.getenv('MEMORY_BATCH_SIZE', '8'))
+        )
+    
+    def close(self):
+        """Flush queued memory writes when the analyzer is retired"""
+        self.memory_writer.close()
+    
+    @property
+    def gemini_model(self):
+        return registry.get_model(self.model_name)
+    
+    @property
+    def lemonfox_api_key(self):
+        # Read on use so reloaded configuration takes effect
+        return os.getenv('LEMONFOX_API_KEY')
     
     def convert_audio_to_wav(self, audio_path):
-        """Convert any audio format to WAV for processing"""
+        """Path of a 16kHz mono PCM WAV of the file, converting only when the header says so"""
         try:
-            audio = AudioSegment.from_file(audio_path)
-            wav_path = audio_path.replace(audio_path.split('.')[-1], 'wav')
-            audio = audio.set_channels(1)  # Convert to mono
-            audio = audio.set_frame_rate(16000)  # Set sample rate to 16kHz
-            audio.export(wav_path, format="wav")
+            audio_format = probe_audio(audio_path)
+            if audio_format is not None and audio_format.is_target:
+                return audio_path
+            
+            # A new name next to the input, so a WAV that needs resampling is never overwritten
+            wav_path = f"{os.path.splitext(audio_path)[0]}.16k.wav"
+            decode_audio(audio_path).save_wav(wav_path)
             return wav_path
         except Exception as e:
             print(f"Error converting audio: {e}")
             return audio_path
     
-    def diarize_speakers(self, audio_path, transcription_data, max_speakers=2):
+    def load_audio(self, audio):
+        """Decode an audio file once, passing already decoded audio through"""
+        if isinstance(audio, DecodedAudio):
+            return audio
+        return decode_audio(audio)
+    
+    def diarize_speakers(self, audio, transcription_data, max_speakers=2, user_id=DEFAULT_USER,
+                         previous_segments=None):
         """Use Gemini to perform speaker diarization based on transcript"""
         try:
             transcript = transcription_data.get('transcript', '')
@@ -47,13 +120,26 @@ class ConversationAnalyzer:
                 print("Empty transcript, creating single speaker segment")
                 return self.create_single_speaker_segments(transcription_data)
             
+            # Splitting a transcript by text needs all of it, so oversized ones are clustered locally instead
+            if not self.budget.fits('diarization', transcript):
+                print("Transcript exceeds the diarization token budget, using acoustic diarization")
+                return self.diarize_acoustic(audio, transcription_data)
+            
             # Use past conversations as context if available
             context = ""
-            if self.conversation_memory:
+            recent_memory = self.load_memory(user_id, limit=3)
+            if recent_memory:
                 context = "Previous conversation patterns:\n"
-                for memory in self.conversation_memory[-3:]:
+                for memory in recent_memory:
                     context += f"- {memory.get('summary', '')}\n"
             
+            # In chunked mode, keep speaker labels consistent with the previous chunk
+            if previous_segments:
+                context += "\nThe transcript continues a conversation that ended with:\n"
+                for segment in previous_segments:
+                    context += f"{segment['speaker']}: {segment['text'][-300:]}\n"
+                context += "Keep using the same speaker labels for the same people.\n"
+            
             # Create prompt for Gemini to identify speakers
             prompt = f"""
 You are a speaker diarization expert. Analyze this transcript and identify different speakers.
@@ -78,7 +164,7 @@ Respond with ONLY this JSON format (no markdown, no extra text):
 }}
 """
             
-            response = self.gemini_model.generate_content(prompt)
+            response = self.budget.generate(self.gemini_model, 'diarization', prompt)
             
             # Parse the response
             try:
@@ -108,29 +194,15 @@ Respond with ONLY this JSON format (no markdown, no extra text):
                 
                 if not segments:
                     print("No segments found in Gemini response")
-                    return self.create_single_speaker_segments(transcription_data)
+                    return self.fallback_segments(transcription_data)
                 
-                # Add timestamps based on word count
-                y, sr = librosa.load(audio_path, sr=16000)
-                total_duration = len(y) / sr
-                total_words = len(transcript.split())
-                
-                current_time = 0
-                formatted_segments = []
-                
-                for segment in segments:
-                    segment_text = segment.get('text', '')
-                    segment_words = len(segment_text.split())
-                    segment_duration = (segment_words / total_words) * total_duration if total_words > 0 else total_duration / len(segments)
-                    
-                    formatted_segments.append({
-                        'speaker': segment.get('speaker', 'Speaker 1'),
-                        'start_time': current_time,
-                        'end_time': current_time + segment_duration,
-                        'text': segment_text
-                    })
-                    
-                    current_time += segment_duration
+                # Map the segments onto real speech timing instead of spreading them by word count
+                word_timestamps = transcription_data.get('word_timestamps')
+                if not word_timestamps:
+                    audio = self.load_audio(audio)
+                    word_timestamps = estimate_word_timestamps(transcript.split(), audio.samples, audio.sample_rate,
+                                                               flags=audio.speech_flags())
+                formatted_segments = align_segments(segments, word_timestamps)
                 
                 print(f"Generated {len(formatted_segments)} speaker segments")
                 return formatted_segments
@@ -138,11 +210,11 @@ Respond with ONLY this JSON format (no markdown, no extra text):
             except (json.JSONDecodeError, KeyError, IndexError) as e:
                 print(f"Failed to parse Gemini response: {e}")
                 print(f"Response text: {response_text}")
-                return self.create_single_speaker_segments(transcription_data)
+                return self.fallback_segments(transcription_data)
             
         except Exception as e:
             print(f"Error in Gemini diarization: {e}")
-            return self.create_single_speaker_segments(transcription_data)
+            return self.fallback_segments(transcription_data)
     
     def create_single_speaker_segments(self, transcription_data):
         """Create a single speaker segment when diarization fails"""
@@ -165,41 +237,33 @@ Respond with ONLY this JSON format (no markdown, no extra text):
             'text': transcript
         }]
     
-    def load_memory(self):
-        """Load conversation memory from file"""
+    def fallback_segments(self, transcription_data):
+        """Single-speaker segments after a failed diarization; the transcription is marked partial
+        so a transient outage is never cached or fingerprinted as the answer for this recording"""
+        transcription_data['partial'] = True
+        return self.create_single_speaker_segments(transcription_data)
+    
+    def load_memory(self, user_id=DEFAULT_USER, limit=5):
+        """Load the user's most recent conversations from the memory store"""
         try:
-            if os.path.exists(self.memory_file):
-                with open(self.memory_file, 'r') as f:
-                    memory = json.load(f)
-                    # Keep only last 5 conversations
-                    return memory[-5:] if len(memory) > 5 else memory
+            return self.memory.recent(user_id, limit)
         except Exception as e:
             print(f"Error loading memory: {e}")
         return []
     
-    def save_to_memory(self, conversation_data):
-        """Save conversation to memory"""
+    def save_to_memory(self, conversation_data, user_id=DEFAULT_USER):
+        """Queue conversation for background summarization and storage"""
         try:
-            # Create a summary of the conversation
-            summary = {
+            entry = {
                 'timestamp': datetime.now().isoformat(),
                 'transcript': conversation_data.get('transcript', '')[:500],  # First 500 chars
                 'speakers': conversation_data.get('num_speakers', 1),
-                'duration': conversation_data.get('audio_duration', 0),
-                'summary': self.generate_summary(conversation_data.get('transcript', ''))
+                'duration': conversation_data.get('audio_duration', 0)
             }
             
-            # Add to memory
-            self.conversation_memory.append(summary)
+            # The summary is generated by the memory writer, not on the response path
+            self.memory_writer.submit(user_id, entry, conversation_data.get('transcript', '')[:1000])
             
-            # Keep only last 5
-            if len(self.conversation_memory) > 5:
-                self.conversation_memory = self.conversation_memory[-5:]
-            
-            # Save to file
-            with open(self.memory_file, 'w') as f:
-                json.dump(self.conversation_memory, f, indent=2)
-                
         except Exception as e:
             print(f"Error saving to memory: {e}")
     
@@ -210,134 +274,173 @@ Respond with ONLY this JSON format (no markdown, no extra text):
                 return "Empty conversation"
             
             prompt = f"""Summarize this conversation in one sentence (max 100 characters):
-            {transcript[:1000]}
+            {self.budget.fit('conversation_summary', transcript, marker='')}
             """
             
-            response = self.gemini_model.generate_content(prompt)
+            response = self.budget.generate(self.gemini_model, 'conversation_summary', prompt)
             return response.text[:100] if response.text else "Conversation analyzed"
         except:
             return "Conversation analyzed"
     
-    def perform_speaker_diarization(self, audio_path):
+    def generate_summaries(self, transcripts):
+        """Summarize a batch of conversations with a single Gemini call"""
+        if len(transcripts) == 1:
+            return [self.generate_summary(transcripts[0])]
+        
+        # The input budget applies to each conversation in the batch
+        numbered = "\n\n".join(f"Conversation {i + 1}:\n{self.budget.fit('conversation_summaries', transcript, marker='')}"
+                               for i, transcript in enumerate(transcripts))
+        prompt = f"""Summarize each of these conversations in one sentence (max 100 characters each).
+
+{numbered}
+
+Respond with ONLY a JSON array of {len(transcripts)} strings, one per conversation, in order."""
+        
+        try:
+            response_text = self.budget.generate(self.gemini_model, 'conversation_summaries', prompt).text.strip()
+            start_idx = response_text.find('[')
+            end_idx = response_text.rfind(']') + 1
+            summaries = json.loads(response_text[start_idx:end_idx])
+            if len(summaries) != len(transcripts):
+                raise ValueError(f"expected {len(transcripts)} summaries, got {len(summaries)}")
+        except Exception as e:
+            print(f"Batch summary failed, summarizing individually: {e}")
+            return [self.generate_summary(transcript) for transcript in transcripts]
+        
+        return [str(summary)[:100] if transcript else "Empty conversation"
+                for summary, transcript in zip(summaries, transcripts)]
+    
+    def perform_speaker_diarization(self, audio):
         """Custom speaker diarization using audio features and clustering"""
         try:
-            # Load audio
-            y, sr = librosa.load(audio_path, sr=16000)
-            
-            # Extract MFCC features for speaker characteristics
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, hop_length=512)
-            
-            # Segment audio into chunks
-            chunk_length = int(sr * 2)  # 2-second chunks
-            chunks = []
-            chunk_features = []
-            
-            for i in range(0, len(y), chunk_length):
-                chunk = y[i:i+chunk_length]
-                if len(chunk) < chunk_length * 0.5:  # Skip very short chunks
-                    continue
-                
-                # Extract features for this chunk
-                chunk_mfcc = librosa.feature.mfcc(y=chunk, sr=sr, n_mfcc=13)
-                chunk_feature = np.mean(chunk_mfcc, axis=1)
-                chunk_features.append(chunk_feature)
-                chunks.append({
-                    'start': i / sr,
-                    'end': min((i + chunk_length) / sr, len(y) / sr),
-                    'audio': chunk
-                })
-            
-            if len(chunk_features) < 2:
-                # Not enough data for diarization
-                return [{
-                    'speaker': 'Speaker 1',
-                    'segments': [(0, len(y) / sr)]
-                }]
-            
-            # Perform clustering (K-means with k=2 for two speakers)
-            features_array = np.array(chunk_features)
-            n_speakers = min(2, len(features_array))  # Max 2 speakers as per requirement
-            kmeans = KMeans(n_clusters=n_speakers, random_state=42)
-            labels = kmeans.fit_predict(features_array)
-            
-            # Group segments by speaker
-            speaker_segments = {f'Speaker {i+1}': [] for i in range(n_speakers)}
-            
-            for idx, label in enumerate(labels):
-                speaker = f'Speaker {label + 1}'
-                segment = chunks[idx]
-                speaker_segments[speaker].append((segment['start'], segment['end']))
-            
-            # Merge consecutive segments from the same speaker
-            diarization_result = []
-            for speaker, segments in speaker_segments.items():
-                if segments:
-                    merged_segments = []
-                    segments.sort(key=lambda x: x[0])
-                    
-                    current_start, current_end = segments[0]
-                    for start, end in segments[1:]:
-                        if start - current_end < 1.0:  # Merge if gap < 1 second
-                            current_end = end
-                        else:
-                            merged_segments.append((current_start, current_end))
-                            current_start, current_end = start, end
-                    merged_segments.append((current_start, current_end))
-                    
-                    diarization_result.append({
-                        'speaker': speaker,
-                        'segments': merged_segments
-                    })
-            
-            return diarization_result
+            # Reuse the decoded buffer
+            audio = self.load_audio(audio)
+            return self.acoustic_diarizer.diarize(audio.samples, audio.sample_rate, audio.speech_flags())
             
         except Exception as e:
             print(f"Error in speaker diarization: {e}")
             return []
     
-    def transcribe_audio(self, audio_path):
+    def diarize_acoustic(self, audio, transcription_data, turns=None):
+        """Speaker segments from acoustic clustering, with transcript words placed on the speaker turns"""
+        try:
+            audio = self.load_audio(audio)
+            word_timestamps = transcription_data.get('word_timestamps')
+            if not word_timestamps:
+                word_timestamps = estimate_word_timestamps(
+                    transcription_data.get('transcript', '').split(), audio.samples, audio.sample_rate,
+                    flags=audio.speech_flags()
+                )
+            
+            if turns is None:
+                turns = self.acoustic_diarizer.turns(audio.samples, audio.sample_rate, audio.speech_flags())
+            segments = assign_words_to_turns(word_timestamps, turns)
+            return segments or self.create_single_speaker_segments(transcription_data)
+            
+        except Exception as e:
+            print(f"Error in acoustic diarization: {e}")
+            return self.fallback_segments(transcription_data)
+    
+    def label_speaker_roles(self, segments, roles=None):
+        """Ask Gemini to name speaker roles (e.g. Agent, Customer) from a few sample lines"""
+        roles = roles if roles is not None else {}
+        speakers = list(dict.fromkeys(segment['speaker'] for segment in segments))
+        
+        # Roles already named by an earlier chunk are reused without another call
+        unnamed = [speaker for speaker in speakers if speaker not in roles]
+        if unnamed and len(speakers) > 1:
+            samples = ""
+            for speaker in unnamed:
+                lines = [segment['text'][:200] for segment in segments if segment['speaker'] == speaker][:3]
+                samples += "".join(f"{speaker}: {line}\n" for line in lines)
+            
+            prompt = f"""These are sample lines from a conversation, grouped by speaker:
+
+{self.budget.fit('speaker_roles', samples, marker='')}
+Give each speaker a short role name such as "Agent" or "Customer".
+Respond with ONLY a JSON object mapping each speaker label to its role."""
+            
+            try:
+                response_text = self.budget.generate(self.gemini_model, 'speaker_roles', prompt).text.strip()
+                start_idx = response_text.find('{')
+                end_idx = response_text.rfind('}') + 1
+                named = json.loads(response_text[start_idx:end_idx])
+                roles.update({speaker: str(named[speaker]).strip() for speaker in unnamed
+                              if str(named.get(speaker, '')).strip()})
+            except Exception as e:
+                print(f"Failed to label speaker roles: {e}")
+        
+        # Keep two speakers from collapsing into the same role name
+        names = list(roles.values())
+        if len(set(names)) != len(names):
+            return segments
+        
+        return [{**segment, 'speaker': roles.get(segment['speaker'], segment['speaker'])}
+                for segment in segments]
+    
+    def hybrid_fallback(self, turns):
+        """Hybrid mode hands a recording that clusters into a single voice to Gemini, which may still
+        tell the speakers apart from the transcript; otherwise there would be no roles to name"""
+        if self.diarization_mode == 'hybrid' and len({speaker for _, _, speaker in turns}) < 2:
+            print("Acoustic clustering found a single speaker, diarizing the transcript with Gemini")
+            return True
+        return False
+    
+    def assign_speakers(self, audio, transcription_data, user_id=DEFAULT_USER, previous_segments=None,
+                        turns=None, roles=None, mode=None):
+        """Run the configured diarization mode"""
+        mode = mode or self.diarization_mode
+        if mode in ACOUSTIC_MODES and turns is None:
+            try:
+                audio = self.load_audio(audio)
+                turns = self.acoustic_diarizer.turns(audio.samples, audio.sample_rate, audio.speech_flags())
+                if self.hybrid_fallback(turns):
+                    mode = 'gemini'
+            except Exception as e:
+                print(f"Error in acoustic clustering: {e}")
+        
+        if mode in ACOUSTIC_MODES:
+            segments = self.diarize_acoustic(audio, transcription_data, turns)
+            if mode == 'hybrid' and self.label_roles:
+                segments = self.label_speaker_roles(segments, roles)
+            return segments
+        return self.diarize_speakers(audio, transcription_data, user_id=user_id,
+                                     previous_segments=previous_segments)
+    
+    def transcribe_audio(self, audio):
         """Transcribe audio using LemonFox AI API"""
         try:
-            # Upload the audio file to LemonFox API
+            audio = self.load_audio(audio)
+            
+            # Upload the in-memory WAV encoding to LemonFox API
             headers = {
                 "Authorization": f"Bearer {self.lemonfox_api_key}"
             }
+            files = {"file": ("audio.wav", audio.wav_bytes, "audio/wav")}
+            data = {
+                "language": "english",
+                # Ask for real word timings instead of spreading words evenly
+                "response_format": "verbose_json",
+                "timestamp_granularities[]": "word"
+            }
             
-            with open(audio_path, 'rb') as audio_file:
-                files = {"file": audio_file}
-                data = {
-                    "language": "english",
-                    "response_format": "json"
-                }
-                
-                response = requests.post(
-                    self.lemonfox_url,
-                    headers=headers,
-                    files=files,
-                    data=data
-                )
+            response = self.http.post(
+                self.lemonfox_url,
+                endpoint='lemonfox.transcriptions',
+                headers=headers,
+                files=files,
+                data=data
+            )
             
             if response.status_code == 200:
                 result = response.json()
                 transcript = result.get('text', '')
                 
-                # Get audio duration for timestamp generation
-                y, sr = librosa.load(audio_path, sr=16000)
-                duration = len(y) / sr
-                
-                # Generate approximate word timestamps
-                words = transcript.split()
-                word_timestamps = []
-                words_per_second = len(words) / max(duration, 1)
-                
-                for i, word in enumerate(words):
-                    start_time = i / words_per_second
-                    end_time = (i + 1) / words_per_second
-                    word_timestamps.append({
-                        'word': word,
-                        'start_time': start_time,
-                        'end_time': min(end_time, duration)
-                    })
+                # Word timings from the API, or estimated over the detected speech regions
+                word_timestamps = words_from_response(result)
+                if not word_timestamps:
+                    word_timestamps = estimate_word_timestamps(transcript.split(), audio.samples, audio.sample_rate,
+                                                               flags=audio.speech_flags())
                 
                 return {
                     'transcript': transcript,
@@ -345,13 +448,13 @@ Respond with ONLY this JSON format (no markdown, no extra text):
                 }
             else:
                 print(f"LemonFox API error: {response.status_code}")
-                return self.transcribe_with_gemini(audio_path)
+                return self.transcribe_with_gemini(audio)
             
         except Exception as e:
             print(f"Error in LemonFox transcription: {e}")
-            return self.transcribe_with_gemini(audio_path)
+            return self.transcribe_with_gemini(audio)
     
-    def transcribe_with_gemini(self, audio_path):
+    def transcribe_with_gemini(self, audio):
         """Fallback transcription using Gemini (limited capability)"""
         try:
             # Note: Gemini has limited audio transcription capabilities
@@ -360,51 +463,304 @@ Respond with ONLY this JSON format (no markdown, no extra text):
             Please note that this is an audio file that needs to be transcribed.
             Provide a general transcription or indicate if audio transcription is not available."""
             
-            response = self.gemini_model.generate_content(prompt)
+            response = self.budget.generate(self.gemini_model, 'transcription_fallback', prompt)
             
+            # Fallback transcripts are marked partial so an upstream outage is never cached
             return {
                 'transcript': response.text if response.text else "Audio transcription not available via Gemini API",
-                'word_timestamps': []
+                'word_timestamps': [],
+                'partial': True
             }
         except Exception as e:
             return {
                 'transcript': f"Transcription error: {str(e)}",
-                'word_timestamps': []
+                'word_timestamps': [],
+                'partial': True
             }
     
-    def analyze(self, audio_path):
-        """Main method to analyze audio file"""
+    def match_fingerprint(self, audio):
+        """Fingerprint the decoded audio and find a recent recording sharing enough of it"""
+        if not self.fingerprints.enabled:
+            return None, None, None
+        with tracer.span('conversation.fingerprint'):
+            prints, frame_seconds = fingerprint(audio.samples, audio.sample_rate)
+            match = self.fingerprints.lookup(prints)
+        
+        # Short recordings only need to be mostly covered, long ones need a minimum overlap
+        if match is not None and match.seconds < min(self.min_overlap_seconds, audio.duration * 0.9):
+            match = None
+        return prints, frame_seconds, match
+    
+    def reuse_window(self, match):
+        """Words and speaker turns of the matched recording inside the overlap, shifted to this recording's time"""
+        earlier = match.entry.result
+        low, high = match.start + match.offset, match.end + match.offset
+        words = [{**word, 'start_time': max(0.0, round(word['start_time'] - match.offset, 3)),
+                  'end_time': max(0.0, round(word['end_time'] - match.offset, 3))}
+                 for word in earlier['word_timestamps']
+                 if low <= (word['start_time'] + word['end_time']) / 2 < high]
+        turns = [(max(segment['start_time'], low) - match.offset, min(segment['end_time'], high) - match.offset,
+                  segment['speaker'])
+                 for segment in earlier['speaker_segments']
+                 if segment['end_time'] > low and segment['start_time'] < high]
+        return words, turns
+    
+    def reuse_analysis(self, match):
+        """Transcript and diarization of a near-duplicate, cut to the shared audio"""
+        earlier = match.entry.result
+        
+        # The same recording, only re-encoded: reuse everything as is
+        if match.start + match.offset <= 0.5 and match.end + match.offset >= earlier['duration'] - 0.5:
+            segments = [{**segment, 'start_time': max(0.0, round(segment['start_time'] - match.offset, 3)),
+                         'end_time': max(0.0, round(segment['end_time'] - match.offset, 3))}
+                        for segment in earlier['speaker_segments']]
+            return earlier['transcript'], segments
+        
+        # A trimmed copy: keep the words and speaker turns inside the trimmed range
+        words, turns = self.reuse_window(match)
+        return ' '.join(word['word'] for word in words), assign_words_to_turns(words, turns)
+    
+    def transcribe_range(self, audio, start=0, end=None):
+        """Transcribe the samples between two offsets, in chunks past the upload limit, on the recording's clock"""
+        end = len(audio.samples) if end is None else end
+        whole = start == 0 and end == len(audio.samples)
+        piece = audio if whole else audio.slice(start, end)
+        if piece.duration <= self.upload_seconds:
+            return self.shift_words(self.transcribe_audio(piece), start / audio.sample_rate)
+        
+        # Split on pauses, reusing the cached VAD flags when the range is the whole recording
+        chunks = split_on_silence(piece.samples, audio.sample_rate, self.chunk_seconds,
+                                  flags=audio.speech_flags() if whole else None)
+        
+        # Only a window of chunk uploads is in flight, and whatever is left is cancelled on error
+        futures = {}
+        texts, words = [], []
+        partial = False
+        try:
+            for index, (chunk_start, _) in enumerate(chunks):
+                for ahead in range(index, min(index + self.transcribe_concurrency, len(chunks))):
+                    if ahead not in futures:
+                        futures[ahead] = self.transcription_executor.submit(
+                            self.transcribe_audio, piece.slice(*chunks[ahead])
+                        )
+                transcription = self.shift_words(futures.pop(index).result(),
+                                                 (start + chunk_start) / audio.sample_rate)
+                partial = partial or transcription.get('partial', False)
+                texts.append(transcription['transcript'])
+                words.extend(transcription['word_timestamps'])
+        finally:
+            for future in futures.values():
+                future.cancel()
+        
+        result = {
+            'transcript': ' '.join(text for text in texts if text),
+            'word_timestamps': words
+        }
+        if partial:
+            result['partial'] = True
+        return result
+    
+    def shift_words(self, transcription, offset):
+        """Transcription with its word timings moved by offset seconds"""
+        if not offset:
+            return transcription
+        return {**transcription, 'word_timestamps': [
+            {**word, 'start_time': round(word['start_time'] + offset, 3), 'end_time': round(word['end_time'] + offset, 3)}
+            for word in transcription['word_timestamps']
+        ]}
+    
+    def transcribe_new_audio(self, audio, match):
+        """Transcribe only the parts of the recording outside the overlap with an earlier one"""
+        words, _ = self.reuse_window(match)
+        pieces = [(match.start, ' '.join(word['word'] for word in words))]
+        partial = False
+        
+        gaps = [(start, end) for start, end in ((0.0, match.start), (match.end, audio.duration)) if end - start >= 0.5]
+        for start, end in gaps:
+            transcription = self.transcribe_range(audio, int(start * audio.sample_rate), int(end * audio.sample_rate))
+            partial = partial or transcription.get('partial', False)
+            pieces.append((start, transcription['transcript']))
+            words.extend(transcription['word_timestamps'])
+        
+        pieces.sort(key=lambda piece: piece[0])
+        words.sort(key=lambda word: word['start_time'])
+        result = {
+            'transcript': ' '.join(text for _, text in pieces if text),
+            'word_timestamps': words
+        }
+        if partial:
+            result['partial'] = True
+        return result
+    
+    def analyze_stream(self, audio_source, user_id=DEFAULT_USER):
+        """Yield speaker-labelled segments chunk by chunk for long recordings"""
         try:
-            # Convert to WAV for processing
-            wav_path = self.convert_audio_to_wav(audio_path)
+            audio = self.load_audio(audio_source)
+            memory_context = [m.get('summary', '') for m in self.load_memory(user_id, limit=3)]
+            
+            # Split on pauses so no words are cut in half
+            chunks = split_on_silence(audio.samples, audio.sample_rate, self.chunk_seconds, flags=audio.speech_flags())
+            yield {
+                'type': 'started',
+                'audio_duration': audio.duration,
+                'num_chunks': len(chunks),
+                'memory_context': memory_context
+            }
             
-            # Get audio duration
-            y, sr = librosa.load(wav_path, sr=16000)
-            duration = len(y) / sr
+            # Transcribe a few chunks ahead of the one being diarized, in order so labels carry over;
+            # a client that disconnects leaves at most that window of LemonFox calls behind
+            futures = {}
             
-            # Perform transcription using LemonFox API
-            transcription_result = self.transcribe_audio(wav_path)
+            def submit_ahead(index):
+                for ahead in range(index, min(index + self.stream_lookahead + 1, len(chunks))):
+                    if ahead not in futures:
+                        start, end = chunks[ahead]
+                        futures[ahead] = self.transcription_executor.submit(self.transcribe_audio, audio.slice(start, end))
             
-            # Perform speaker diarization using Gemini
-            speaker_segments = self.diarize_speakers(wav_path, transcription_result)
+            try:
+                submit_ahead(0)
+                
+                # Acoustic turns are computed over the whole recording so labels agree across chunks
+                turns = None
+                roles = {}
+                mode = self.diarization_mode
+                if mode in ACOUSTIC_MODES:
+                    turns = self.acoustic_diarizer.turns(audio.samples, audio.sample_rate, audio.speech_flags())
+                    if self.hybrid_fallback(turns):
+                        mode, turns = 'gemini', None
+                
+                transcripts = []
+                speakers = set()
+                previous_segments = []
+                for index, (start, end) in enumerate(chunks):
+                    submit_ahead(index)
+                    transcription_result = futures.pop(index).result()
+                    transcripts.append(transcription_result['transcript'])
+                    
+                    offset = start / audio.sample_rate
+                    chunk_turns = None
+                    if turns is not None:
+                        chunk_end = end / audio.sample_rate
+                        chunk_turns = [(max(t_start, offset) - offset, min(t_end, chunk_end) - offset, speaker)
+                                       for t_start, t_end, speaker in turns if t_end > offset and t_start < chunk_end]
+                    
+                    segments = self.assign_speakers(
+                        audio.slice(start, end), transcription_result,
+                        user_id=user_id, previous_segments=previous_segments, turns=chunk_turns, roles=roles,
+                        mode=mode
+                    )
+                    for segment in segments:
+                        speakers.add(segment['speaker'])
+                        yield {
+                            'type': 'segment',
+                            'chunk': index,
+                            'speaker': segment['speaker'],
+                            'start_time': segment['start_time'] + offset,
+                            'end_time': segment['end_time'] + offset,
+                            'text': segment['text']
+                        }
+                    previous_segments = segments[-2:]
+                
+                result = {
+                    'transcript': ' '.join(t for t in transcripts if t),
+                    'audio_duration': audio.duration,
+                    'num_speakers': len(speakers) or 1
+                }
+                self.save_to_memory(result, user_id)
+                
+                yield {'type': 'complete', **result}
+            finally:
+                for future in futures.values():
+                    future.cancel()
             
-            # Clean up temporary file if created
-            if wav_path != audio_path and os.path.exists(wav_path):
-                os.remove(wav_path)
+        except Exception as e:
+            print(f"Error in streaming audio analysis: {e}")
+            yield {'type': 'error', 'error': str(e)}
+    
+    def analyze(self, audio_source, user_id=DEFAULT_USER):
+        """Main method to analyze audio file"""
+        try:
+            # Reuse the result when the same recording was already analyzed
+            cache_key = self.cache.make_key('conversation', source_hash(audio_source),
+                                            f"{self.PROMPT_VERSION}:{self.diarization_mode}:{self.label_roles}", self.model_name)
+            recent_memory = self.load_memory(user_id, limit=3)
+            memory_context = [m.get('summary', '') for m in recent_memory]
+            
+            # Cached results are shared across users, so memory context is always the caller's own
+            cached = self.cache.get(cache_key)
+            tracer.record_cache('conversation', cached is not None)
+            if cached is not None:
+                # The caller's history gets the conversation unless it was their own upload
+                if cached.pop('user_id', None) != user_id:
+                    self.save_to_memory(cached, user_id)
+                cached['memory_context'] = memory_context
+                return cached
+            
+            # Decode once to 16kHz mono and share the buffer with every stage
+            audio = self.load_audio(audio_source)
+            duration = audio.duration
+            
+            # Recordings sharing audio with a recent one reuse what was already transcribed
+            prints, frame_seconds, match = self.match_fingerprint(audio)
+            near_duplicate = match is not None and match.seconds >= duration * self.near_duplicate_share
+            
+            if near_duplicate:
+                transcript, speaker_segments = self.reuse_analysis(match)
+                transcription_result = None
+            else:
+                # Perform transcription using LemonFox API, only for audio not heard before
+                with tracer.span('conversation.transcribe') as span:
+                    if match is not None:
+                        transcription_result = self.transcribe_new_audio(audio, match)
+                    else:
+                        span.set(bytes=len(audio.samples) * 2)  # 16-bit PCM uploaded
+                        transcription_result = self.transcribe_range(audio)
+                
+                # Perform speaker diarization with the configured mode
+                with tracer.span(f'conversation.diarize.{self.diarization_mode}'):
+                    speaker_segments = self.assign_speakers(audio, transcription_result, user_id=user_id)
+                transcript = transcription_result['transcript']
             
             result = {
-                'transcript': transcription_result['transcript'],
+                'transcript': transcript,
                 'speaker_segments': speaker_segments,
                 'audio_duration': duration,
                 'num_speakers': len(set(s['speaker'] for s in speaker_segments)) if speaker_segments else 1,
-                'memory_context': [m.get('summary', '') for m in self.conversation_memory[-3:]] if self.conversation_memory else []
+                'memory_context': memory_context
             }
+            if match is not None:
+                result['fingerprint_match'] = {
+                    'type': 'near_duplicate' if near_duplicate else 'overlap',
+                    'reused_seconds': round(match.seconds, 2),
+                    'offset_seconds': round(match.offset, 2),
+                    'bit_error_rate': round(match.bit_error, 3)
+                }
+            if transcription_result is not None and transcription_result.get('partial'):
+                result['partial'] = True
+            
+            # A near-duplicate of the caller's own recording is already in their memory; saving it
+            # again would only add a second summary. Another user's recording is not in theirs
+            if not near_duplicate or match.entry.result.get('user_id') != user_id:
+                with tracer.span('conversation.save_memory'):
+                    self.save_to_memory(result, user_id)
+            
+            # Only recordings with word timings can later be cut into reusable pieces
+            if (not near_duplicate and prints is not None and transcription_result.get('word_timestamps')
+                    and not result.get('partial')):
+                self.fingerprints.add(cache_key, prints, frame_seconds, {
+                    'transcript': transcript,
+                    'word_timestamps': transcription_result['word_timestamps'],
+                    'speaker_segments': speaker_segments,
+                    'duration': duration,
+                    'user_id': user_id
+                })
             
-            # Save to memory
-            self.save_to_memory(result)
+            if is_cacheable(result):
+                self.cache.set(cache_key, {**{k: v for k, v in result.items() if k != 'memory_context'},
+                                           'user_id': user_id})
             
             return result
-        
+            
         except Exception as e:
             print(f"Error in audio analysis: {e}")
             return {
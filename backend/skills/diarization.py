@@ -0,0 +1,190 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .vad import speech_frames, FRAME_MS
+from .audio import framed_blocks
+from .tracing import tracer
+
+# Cosine distance at which voices merge. The repo's two-party sample call separates into its two speakers
+# between 0.2 and 0.3 (0.35 merges them, 0.15 finds three) and the synthetic bench call
+# between 0.15 and 0.35, while either speaker of both calls on its own stays one voice up to 0.35;
+# 0.25 sits in the middle of the range that is right for all of them
+DISTANCE_THRESHOLD = 0.25
+
+class AcousticDiarizer:
+    """Speaker clustering over MFCC frames pooled into sliding windows"""
+    
+    def __init__(self, window_seconds=1.5, hop_seconds=0.5, distance_threshold=DISTANCE_THRESHOLD,
+                 max_speakers=None, smoothing_windows=5, max_cluster_windows=1500, min_speaker_share=0.05):
+        self.window_seconds = window_seconds
+        self.hop_seconds = hop_seconds
+        self.distance_threshold = distance_threshold
+        self.max_speakers = max_speakers
+        self.smoothing_windows = smoothing_windows
+        self.max_cluster_windows = max_cluster_windows
+        self.min_speaker_share = min_speaker_share
+        
+        # 10ms feature frames, computed about 30 seconds at a time
+        self.frame_hop = 160
+        self.n_fft = 400
+        self.block_frames = 3000
+    
+    def window_features(self, samples, sample_rate):
+        """Mean and standard deviation of MFCCs over every sliding window, computed block by block"""
+        import librosa
+        hop_length = self.frame_hop * sample_rate // 16000
+        n_fft = self.n_fft * sample_rate // 16000
+        frame_seconds = hop_length / sample_rate
+        window = max(1, int(round(self.window_seconds / frame_seconds)))
+        hop = max(1, int(round(self.hop_seconds / frame_seconds)))
+        
+        # Running sums for the per-coefficient normalization over the whole recording
+        total = np.zeros(19)
+        total_sq = np.zeros(19)
+        count = 0
+        
+        # Frames still needed by upcoming windows; first_frame is the index of pending[0]
+        pending = np.zeros((0, 19), dtype=np.float32)
+        first_frame = 0
+        next_window = 0
+        pooled = []
+        for block in framed_blocks(samples, n_fft, hop_length, self.block_frames):
+            mfcc = librosa.feature.mfcc(y=block, sr=sample_rate, n_mfcc=20, n_fft=n_fft,
+                                        hop_length=hop_length, center=False)
+            # Drop c0 (loudness) so clusters follow voice timbre rather than volume
+            frames = mfcc[1:].T
+            total += frames.sum(axis=0)
+            total_sq += np.square(frames, dtype=np.float64).sum(axis=0)
+            count += len(frames)
+            
+            pending = np.concatenate([pending, frames])
+            complete = (first_frame + len(pending) - window - next_window) // hop + 1
+            if complete > 0:
+                views = sliding_window_view(pending[next_window - first_frame:], window, axis=0)[::hop][:complete]
+                pooled.append(np.concatenate([views.mean(axis=2), views.std(axis=2)], axis=1))
+                next_window += complete * hop
+            
+            # Frames before the next window are not needed again
+            drop = min(next_window - first_frame, len(pending))
+            pending = pending[drop:]
+            first_frame += drop
+        
+        if not pooled:
+            # Shorter than one window: a single window over the whole recording
+            window = len(pending)
+            pooled.append(np.concatenate([pending.mean(axis=0), pending.std(axis=0)])[None])
+        pooled = np.concatenate(pooled)
+        
+        # Normalizing frames is linear, so it can be applied to the pooled statistics afterwards
+        mean = total / count
+        std = np.sqrt(np.maximum(total_sq / count - mean ** 2, 0)) + 1e-8
+        pooled[:, :19] = (pooled[:, :19] - mean) / std
+        pooled[:, 19:] /= std
+        starts = np.arange(len(pooled)) * hop * frame_seconds
+        return pooled.astype(np.float32), starts, window * frame_seconds
+    
+    def window_speech(self, flags, starts, window_seconds):
+        """Fraction of VAD speech frames inside each window"""
+        if len(flags) == 0:
+            return np.ones(len(starts))
+        vad_seconds = FRAME_MS / 1000
+        clock = np.concatenate(([0], np.cumsum(flags)))
+        first = np.minimum((starts / vad_seconds).astype(int), len(flags))
+        last = np.minimum(((starts + window_seconds) / vad_seconds).astype(int), len(flags))
+        return (clock[last] - clock[first]) / np.maximum(last - first, 1)
+    
+    def cluster(self, features):
+        """Agglomerative clustering with an automatic speaker count"""
+        # scikit-learn is only loaded by acoustic diarization
+        from sklearn.cluster import AgglomerativeClustering
+        
+        normalized = features / (np.linalg.norm(features, axis=1, keepdims=True) + 1e-8)
+        if len(normalized) == 1:
+            return np.zeros(1, dtype=int)
+        
+        # Cluster an even subsample on long recordings, then assign every window to the nearest centroid
+        if len(normalized) > self.max_cluster_windows:
+            sample_idx = np.linspace(0, len(normalized) - 1, self.max_cluster_windows).astype(int)
+        else:
+            sample_idx = np.arange(len(normalized))
+        
+        if self.max_speakers == 1:
+            return np.zeros(len(normalized), dtype=int)
+        
+        model = AgglomerativeClustering(n_clusters=None, distance_threshold=self.distance_threshold,
+                                        metric='cosine', linkage='average')
+        sample_labels = model.fit_predict(normalized[sample_idx])
+        if self.max_speakers and sample_labels.max() + 1 > self.max_speakers:
+            model = AgglomerativeClustering(n_clusters=self.max_speakers, metric='cosine', linkage='average')
+            sample_labels = model.fit_predict(normalized[sample_idx])
+        
+        # Fold speakers with too little speech into their nearest neighbour
+        counts = np.bincount(sample_labels)
+        keep = np.flatnonzero(counts >= max(1, self.min_speaker_share * len(sample_labels)))
+        if len(keep) == 0:
+            keep = np.array([np.argmax(counts)])
+        centroids = np.stack([normalized[sample_idx][sample_labels == k].mean(axis=0) for k in keep])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-8
+        
+        return np.argmax(normalized @ centroids.T, axis=1)
+    
+    def smooth(self, labels):
+        """Majority vote over neighbouring windows to remove one-window speaker flips"""
+        if self.smoothing_windows <= 1 or len(labels) < 3:
+            return labels
+        num_labels = labels.max() + 1
+        one_hot = np.eye(num_labels, dtype=np.int32)[labels]
+        half = self.smoothing_windows // 2
+        padded = np.pad(one_hot, ((half + 1, half), (0, 0)), mode='edge')
+        sums = np.cumsum(padded, axis=0)
+        votes = sums[self.smoothing_windows:] - sums[:-self.smoothing_windows]
+        return np.argmax(votes[:len(labels)], axis=1)
+    
+    @tracer.traced('diarization.acoustic')
+    def turns(self, samples, sample_rate, flags=None):
+        """Speaker turns as (start, end, speaker) tuples"""
+        duration = len(samples) / sample_rate
+        if duration == 0:
+            return []
+        
+        pooled, starts, window_seconds = self.window_features(samples, sample_rate)
+        
+        # Cluster only windows that are mostly speech
+        if flags is None:
+            flags = speech_frames(samples, sample_rate)
+        speech = self.window_speech(flags, starts, window_seconds) >= 0.5
+        if not speech.any():
+            return [(0.0, duration, 'Speaker 1')]
+        
+        labels = np.full(len(pooled), -1)
+        labels[speech] = self.cluster(pooled[speech])
+        
+        # Silent windows inherit the previous speaker (or the next one at the start)
+        filled_idx = np.where(labels >= 0, np.arange(len(labels)), 0)
+        np.maximum.accumulate(filled_idx, out=filled_idx)
+        first_speech = np.argmax(labels >= 0)
+        filled_idx[:first_speech] = first_speech
+        labels = self.smooth(labels[filled_idx])
+        
+        # Number speakers by first appearance
+        _, first_seen = np.unique(labels, return_index=True)
+        order = np.argsort(np.argsort(first_seen))
+        labels = order[np.searchsorted(np.unique(labels), labels)]
+        
+        # Speaker changes are placed at the centre of the first window with the new label
+        centers = np.minimum(starts + window_seconds / 2, duration)
+        change = np.flatnonzero(np.diff(labels)) + 1
+        bounds = np.concatenate(([0], change, [len(labels)]))
+        turns = []
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            start_time = 0.0 if begin == 0 else float(centers[begin])
+            end_time = duration if end == len(labels) else float(centers[end])
+            turns.append((start_time, end_time, f'Speaker {labels[begin] + 1}'))
+        return turns
+    
+    def diarize(self, samples, sample_rate, flags=None):
+        """Speaker turns grouped per speaker, in the perform_speaker_diarization format"""
+        grouped = {}
+        for start, end, speaker in self.turns(samples, sample_rate, flags):
+            grouped.setdefault(speaker, []).append((start, end))
+        return [{'speaker': speaker, 'segments': segments} for speaker, segments in grouped.items()]
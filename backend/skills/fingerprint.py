@@ -0,0 +1,186 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .audio import framed_blocks
+from .vad import runs
+
+# 32-bit sub-fingerprints every 32ms from 256ms windows, so a trim or resample that shifts
+# the frame grid by a few milliseconds barely changes the bits
+FRAME_HOP = 512
+FRAME_WINDOW = 4096
+NUM_BANDS = 33
+
+# Frames per spectrogram block, about 30 seconds
+BLOCK_FRAMES = 1024
+
+def fingerprint(samples, sample_rate):
+    """One uint32 per frame: signs of log-mel band energy differences across bands and over time"""
+    import librosa
+    
+    scale = sample_rate / 16000
+    hop = int(FRAME_HOP * scale)
+    n_fft = int(FRAME_WINDOW * scale)
+    if len(samples) < n_fft + 2 * hop:
+        return np.zeros(0, dtype=np.uint32), hop / sample_rate
+    
+    # Spectrogram a block of frames at a time, carrying the last band differences across blocks
+    packed = []
+    previous = None
+    for block in framed_blocks(samples, n_fft, hop, BLOCK_FRAMES):
+        # Telephone band only, which survives lossy codecs and resampling
+        mel = librosa.feature.melspectrogram(y=block, sr=sample_rate, n_fft=n_fft, hop_length=hop,
+                                             n_mels=NUM_BANDS, fmin=300, fmax=3400, center=False)
+        band_diff = np.diff(np.log(mel + 1e-10), axis=0)
+        if previous is not None:
+            band_diff = np.concatenate([previous, band_diff], axis=1)
+        previous = band_diff[:, -1:]
+        bits = (band_diff[:, 1:] - band_diff[:, :-1]) > 0  # (32, frames - 1)
+        packed.append(np.ascontiguousarray(np.packbits(bits.T, axis=1, bitorder='little')).view('<u4').ravel())
+    return np.concatenate(packed).astype(np.uint32), hop / sample_rate
+
+def bit_errors(a, b):
+    """Differing bits per frame between two aligned fingerprints"""
+    return np.unpackbits(np.bitwise_xor(a, b).view(np.uint8)).reshape(-1, 32).sum(axis=1)
+
+class FingerprintEntry:
+    """A fingerprinted recording with the transcript and diarization computed for it"""
+    
+    def __init__(self, prints, frame_seconds, result):
+        self.prints = prints
+        self.frame_seconds = frame_seconds
+        self.result = result
+        self.created_at = time.time()
+        
+        # Sorted copy for vectorized lookups of exactly matching sub-fingerprints
+        self.order = np.argsort(prints, kind='stable')
+        self.sorted = prints[self.order]
+
+class FingerprintMatch:
+    """Where a query overlaps an indexed recording, in query seconds, plus the shift into the entry"""
+    
+    def __init__(self, entry, start, end, offset, bit_error):
+        self.entry = entry
+        self.start = start
+        self.end = end
+        self.offset = offset
+        self.bit_error = bit_error
+    
+    @property
+    def seconds(self):
+        return self.end - self.start
+
+class FingerprintIndex:
+    """In-process index over recent recordings for near-duplicate and overlap detection"""
+    
+    def __init__(self, max_entries=64, max_bit_error=0.3, window_frames=32, max_candidates=3, common_value_limit=16,
+                 max_gap_windows=2):
+        self.max_entries = max_entries
+        self.max_bit_error = max_bit_error
+        self.window_frames = window_frames
+        self.max_gap_windows = max_gap_windows
+        self.max_candidates = max_candidates
+        self.common_value_limit = common_value_limit
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+    
+    def add(self, key, prints, frame_seconds, result):
+        if not self.enabled or len(prints) < self.window_frames:
+            return
+        entry = FingerprintEntry(prints, frame_seconds, result)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def _candidates(self, prints, entry):
+        """Best alignments of the query into one entry, by votes of exactly matching frames"""
+        left = np.searchsorted(entry.sorted, prints, side='left')
+        right = np.searchsorted(entry.sorted, prints, side='right')
+        counts = right - left
+        
+        # Frames such as silence repeat everywhere and only add noise to the vote
+        usable = (counts > 0) & (counts <= self.common_value_limit)
+        if not usable.any():
+            return []
+        query_frames = np.repeat(np.flatnonzero(usable), counts[usable])
+        starts = np.repeat(left[usable], counts[usable])
+        within = np.arange(len(starts)) - np.repeat(np.cumsum(counts[usable]) - counts[usable], counts[usable])
+        offsets = entry.order[starts + within] - query_frames
+        
+        votes = np.bincount(offsets + len(prints))
+        best = np.argsort(votes)[::-1][:self.max_candidates]
+        return [int(offset) - len(prints) for offset in best if votes[offset] >= 3]
+    
+    def _verify(self, prints, entry, offset):
+        """Longest run of aligned windows whose bit error rate stays under the threshold, across short gaps"""
+        query_start = max(0, -offset)
+        query_end = min(len(prints), len(entry.prints) - offset)
+        if query_end - query_start < self.window_frames:
+            return None
+        
+        errors = bit_errors(prints[query_start:query_end], entry.prints[query_start + offset:query_end + offset])
+        windows = len(errors) // self.window_frames
+        rates = errors[:windows * self.window_frames].reshape(windows, self.window_frames).mean(axis=1) / 32
+        good = rates <= self.max_bit_error
+        if not good.any():
+            return None
+        
+        # A lossy re-encode smears the odd window (a plosive, a music sting); a gap of a few windows
+        # between matching ones is bridged instead of cutting the overlap there
+        gap_starts, gap_ends = runs(~good)
+        interior = (gap_starts > 0) & (gap_ends < windows) & (gap_ends - gap_starts <= self.max_gap_windows)
+        for gap_start, gap_end in zip(gap_starts[interior], gap_ends[interior]):
+            good[gap_start:gap_end] = True
+        
+        # Longest stretch of consecutive matching windows
+        run_starts, run_ends = runs(good)
+        longest = np.argmax(run_ends - run_starts)
+        first, last = run_starts[longest], run_ends[longest]
+        
+        start_frame = query_start + first * self.window_frames
+        end_frame = query_start + last * self.window_frames
+        if last == windows:
+            end_frame = query_end  # the partial window at the end of the overlap
+        bit_error = float(rates[first:last].mean())
+        if bit_error > self.max_bit_error:
+            return None
+        return FingerprintMatch(entry, float(start_frame * entry.frame_seconds), float(end_frame * entry.frame_seconds),
+                                offset * entry.frame_seconds, bit_error)
+    
+    def lookup(self, prints):
+        """The indexed recording sharing the most audio with the query, or None"""
+        if not self.enabled or len(prints) < self.window_frames:
+            return None
+        with self.lock:
+            entries = list(self.entries.values())
+        
+        best = None
+        for entry in entries:
+            for offset in self._candidates(prints, entry):
+                match = self._verify(prints, entry, offset)
+                if match is not None and (best is None or match.seconds > best.seconds):
+                    best = match
+        return best
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'seconds': round(sum(len(e.prints) * e.frame_seconds for e in self.entries.values()), 1)
+            }
+
+# Shared by every request in the process; FINGERPRINT_INDEX_SIZE=0 turns detection off
+fingerprint_index = FingerprintIndex(
+    max_entries=int(os.getenv('FINGERPRINT_INDEX_SIZE', '64')),
+    max_bit_error=float(os.getenv('FINGERPRINT_MAX_BIT_ERROR', '0.3')),
+    max_gap_windows=int(os.getenv('FINGERPRINT_MAX_GAP_WINDOWS', '2'))
+)
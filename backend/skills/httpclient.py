@@ -0,0 +1,162 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .tracing import tracer
+from .ratelimit import lemonfox_limiter
+
+# Rate limiting and transient upstream failures are worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class JitteredRetry(Retry):
+    """Exponential backoff with random jitter so parallel workers don't retry in lockstep"""
+    
+    def __init__(self, *args, jitter=0.5, **kwargs):
+        self.jitter = jitter
+        super().__init__(*args, **kwargs)
+    
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.jitter = self.jitter
+        return retry
+    
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return backoff + random.uniform(0, self.jitter) if backoff else backoff
+
+class EndpointStats:
+    """Latency counters for one named endpoint"""
+    
+    def __init__(self, window=200):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.recent = deque(maxlen=window)
+    
+    def record(self, seconds, failed):
+        self.count += 1
+        self.errors += int(failed)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.recent.append(seconds)
+    
+    def snapshot(self):
+        recent = sorted(self.recent)
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else 0.0
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': self.total_seconds / self.count * 1000 if self.count else 0.0,
+            'p50_ms': percentile(0.50) * 1000,
+            'p95_ms': percentile(0.95) * 1000,
+            'max_ms': self.max_seconds * 1000
+        }
+
+class HttpClient:
+    """Shared outbound HTTP client: pooled keep-alive connections, per-host limits, timeouts and retries"""
+    
+    def __init__(self, pool_size=20, per_host_limit=8, connect_timeout=5.0, read_timeout=60.0,
+                 retries=3, backoff_factor=0.5, jitter=0.5):
+        self.per_host_limit = per_host_limit
+        self.timeout = (connect_timeout, read_timeout)
+        self.lock = threading.Lock()
+        self.host_slots = {}
+        self.endpoints = {}
+        self.limiters = {}
+        
+        retry = JitteredRetry(
+            total=retries,
+            connect=retries,
+            read=0,  # a read timeout may mean the upstream is still working, so don't resend
+            status=retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,  # LemonFox uploads are POSTs and safe to resend
+            backoff_factor=backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+            jitter=jitter
+        )
+        
+        # One pool per host, each holding up to pool_size idle keep-alive connections
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    def _host_slot(self, host):
+        slot = self.host_slots.get(host)
+        if slot is None:
+            with self.lock:
+                slot = self.host_slots.setdefault(host, threading.BoundedSemaphore(self.per_host_limit))
+        return slot
+    
+    def limit(self, endpoint, limiter):
+        """Throttle every request to a named endpoint through a shared RateLimiter"""
+        if limiter.enabled:
+            self.limiters[endpoint] = limiter
+    
+    def request(self, method, url, endpoint=None, timeout=None, **kwargs):
+        """Send a request through the pool; endpoint names the latency bucket (defaults to the host)"""
+        host = urlsplit(url).netloc.lower()
+        endpoint = endpoint or host
+        failed = True
+        
+        limiter = self.limiters.get(endpoint)
+        if limiter is not None:
+            limiter.acquire()
+        
+        with self._host_slot(host), tracer.span(f'http.{endpoint}') as span:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+                failed = response.status_code >= 400
+
+                # Content-Length keeps streamed bodies unread; buffered ones are measured only when traced
+                size = response.headers.get('Content-Length', '')
+                if size.isdigit():
+                    span.set(bytes=int(size))
+                elif tracer.enabled and not kwargs.get('stream'):
+                    span.set(bytes=len(response.content))
+                return response
+            finally:
+                self._record(endpoint, time.perf_counter() - start, failed)
+    
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+    
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+    
+    def _record(self, endpoint, seconds, failed):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.record(seconds, failed)
+    
+    def stats(self):
+        """Per-endpoint request counts and latency percentiles"""
+        with self.lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in self.endpoints.items()}
+
+# Shared by every analyzer in the process so connections are reused across requests
+http_client = HttpClient(
+    pool_size=int(os.getenv('HTTP_POOL_SIZE', '20')),
+    per_host_limit=int(os.getenv('HTTP_MAX_PER_HOST', '8')),
+    connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', '5')),
+    read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', '60')),
+    retries=int(os.getenv('HTTP_RETRIES', '3')),
+    backoff_factor=float(os.getenv('HTTP_BACKOFF', '0.5'))
+)
+
+# LEMONFOX_RPM caps transcription calls across all requests, jobs and batches
+http_client.limit('lemonfox.transcriptions', lemonfox_limiter)
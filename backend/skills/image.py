@@ -1,23 +1,126 @@
 import os
-import google.generativeai as genai
 from PIL import Image
 import base64
 import io
+import json
+
+from .cache import result_cache, is_cacheable
+from .sources import open_source, source_hash, source_size
+from .registry import registry
+from .tracing import tracer
+from .budget import prompt_budget
 
 class ImageAnalyzer:
+    # Bump when prompts or result shape change so cached results are not reused
+    PROMPT_VERSION = 'image-v3'
+    
     def __init__(self):
-        # Initialize Gemini for image analysis
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.vision_model = genai.GenerativeModel('gemini-2.5-flash')
+        # Gemini for image analysis, built lazily by the shared registry
+        self.model_name = 'gemini-2.5-flash'
+        
+        # Shared result cache keyed on the upload bytes
+        self.cache = result_cache
+        
+        # Upload limits for the image sent to Gemini
+        self.max_dimension = int(os.getenv('IMAGE_MAX_DIMENSION', '2048'))
+        self.max_upload_bytes = int(os.getenv('IMAGE_MAX_UPLOAD_BYTES', str(1024 * 1024)))
+    
+    @property
+    def vision_model(self):
+        return registry.get_model(self.model_name)
+    
+    def prepare_image(self, image):
+        """Downscale and re-encode an image to a JPEG under the upload size cap"""
+        prepared = image.copy()
+        
+        # Flatten transparency onto white since JPEG has no alpha channel
+        if prepared.mode in ('RGBA', 'LA', 'P'):
+            prepared = prepared.convert('RGBA')
+            background = Image.new('RGB', prepared.size, (255, 255, 255))
+            background.paste(prepared, mask=prepared.split()[-1])
+            prepared = background
+        elif prepared.mode != 'RGB':
+            prepared = prepared.convert('RGB')
+        
+        prepared.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+        
+        # Lower quality first, then dimensions, until the encoding fits the cap
+        quality = 85
+        while True:
+            buffer = io.BytesIO()
+            prepared.save(buffer, format='JPEG', quality=quality, optimize=True)
+            if buffer.tell() <= self.max_upload_bytes or min(prepared.size) <= 256:
+                break
+            if quality > 55:
+                quality -= 15
+            else:
+                prepared = prepared.resize(
+                    (max(1, int(prepared.width * 0.75)), max(1, int(prepared.height * 0.75))),
+                    Image.LANCZOS
+                )
+        
+        return {'mime_type': 'image/jpeg', 'data': buffer.getvalue()}
     
-    def analyze(self, image_path):
+    def parse_json_response(self, response_text):
+        """Parse a JSON object out of a model response"""
+        response_text = response_text.strip()
+        if '```json' in response_text:
+            response_text = response_text.split('```json')[1].split('```')[0].strip()
+        elif '```' in response_text:
+            response_text = response_text.split('```')[1].split('```')[0].strip()
+        
+        start_idx = response_text.find('{')
+        end_idx = response_text.rfind('}') + 1
+        if start_idx != -1 and end_idx > start_idx:
+            response_text = response_text[start_idx:end_idx]
+        return json.loads(response_text)
+    
+    @tracer.traced('image.decode')
+    def load_image(self, image_source):
+        """Open an image from a path or an upload buffer and read its pixels"""
+        with open_source(image_source) as stream:
+            image = Image.open(stream)
+            image.load()
+        return image
+    
+    def analyze(self, image_source, include_text=False, include_objects=False):
         """Analyze image and generate detailed description using Gemini"""
         try:
-            # Open and prepare the image
-            image = Image.open(image_path)
+            # Requested sections and upload limits change the output, so they are part of the key
+            variant = f"{self.PROMPT_VERSION}:text={include_text}:objects={include_objects}:max={self.max_dimension}"
+            cache_key = self.cache.make_key('image', source_hash(image_source), variant, self.model_name)
+            cached = self.cache.get(cache_key)
+            tracer.record_cache('image', cached is not None)
+            if cached is not None:
+                return cached
+            
+            # Open the image and build a smaller upload, keeping the original metadata
+            image = self.load_image(image_source)
+            image_properties = {
+                'format': image.format,
+                'mode': image.mode,
+                'size': f"{image.width}x{image.height}",
+                'file_size': source_size(image_source)
+            }
+            with tracer.span('image.prepare') as span:
+                upload = self.prepare_image(image)
+                span.set(bytes=len(upload['data']))
+            
+            # Optional sections ride along in the same request
+            fields = {
+                'detailed_analysis': 'the comprehensive analysis below, formatted as markdown',
+                'brief_summary': 'a brief one-paragraph summary of the image in 2-3 sentences'
+            }
+            if include_text:
+                fields['extracted_text'] = ("all text visible in the image, keeping its original structure, "
+                                            "or 'No text found in image.'")
+            if include_objects:
+                fields['objects_detected'] = ("a bulleted list of identifiable objects, people, animals or items "
+                                              "with brief descriptions and a count of main objects")
+            field_list = "\n".join(f'- "{key}": {description}' for key, description in fields.items())
             
             # Create a detailed prompt for image analysis
-            prompt = """Please provide a comprehensive analysis of this image including:
+            prompt = f"""Please provide a comprehensive analysis of this image including:
 
 1. **Main Subject**: What is the primary focus or subject of the image?
 2. **Visual Description**: Describe what you see in detail (objects, people, scenery, etc.)
@@ -28,31 +131,42 @@ class ImageAnalyzer:
 7. **Technical Aspects**: Comment on lighting, perspective, or photographic technique if relevant.
 8. **Possible Purpose**: What might be the purpose or use case for this image?
 
-Please be thorough but concise in your analysis."""
-            
-            # Generate content using Gemini
-            response = self.vision_model.generate_content([prompt, image])
+Please be thorough but concise in your analysis.
+
+Respond with ONLY a JSON object with these string fields:
+{field_list}"""
             
-            # Extract text from response
-            if response.text:
-                analysis = response.text
-            else:
-                analysis = "Unable to generate image analysis. Please try again."
+            # One structured request replaces the separate analysis and summary calls
+            response = prompt_budget.generate(
+                self.vision_model, 'image_analysis', [prompt, upload],
+                generation_config={'response_mime_type': 'application/json'}
+            )
             
-            # Also get a brief summary
-            summary_prompt = "Provide a brief one-paragraph summary of this image in 2-3 sentences."
-            summary_response = self.vision_model.generate_content([summary_prompt, image])
+            partial = False
+            try:
+                sections = self.parse_json_response(response.text)
+            except (json.JSONDecodeError, ValueError) as e:
+                # Usually a reply cut off at the output cap; show the raw text but don't cache it
+                print(f"Failed to parse structured image analysis: {e}")
+                sections = {'detailed_analysis': response.text}
+                partial = True
             
-            return {
-                'detailed_analysis': analysis,
-                'brief_summary': summary_response.text if summary_response.text else "Image uploaded successfully.",
-                'image_properties': {
-                    'format': image.format,
-                    'mode': image.mode,
-                    'size': f"{image.width}x{image.height}",
-                    'file_size': os.path.getsize(image_path)
-                }
+            result = {
+                'detailed_analysis': sections.get('detailed_analysis') or "Unable to generate image analysis. Please try again.",
+                'brief_summary': sections.get('brief_summary') or "Image uploaded successfully.",
+                'image_properties': image_properties
             }
+            if include_text:
+                result['extracted_text'] = sections.get('extracted_text') or "No text found in image."
+            if include_objects:
+                result['objects_detected'] = sections.get('objects_detected') or "No objects detected."
+            if partial:
+                result['partial'] = True
+            
+            if is_cacheable(result):
+                self.cache.set(cache_key, result)
+            
+            return result
             
         except Exception as e:
             return {
@@ -62,16 +176,16 @@ Please be thorough but concise in your analysis."""
                 'image_properties': {}
             }
     
-    def extract_text_from_image(self, image_path):
+    def extract_text_from_image(self, image_source):
         """Extract any text present in the image (OCR functionality)"""
         try:
-            image = Image.open(image_path)
+            image = self.load_image(image_source)
             
             prompt = """Extract and transcribe all text visible in this image. 
             If there is no text, respond with 'No text found in image.'
             Format the extracted text maintaining its original structure as much as possible."""
             
-            response = self.vision_model.generate_content([prompt, image])
+            response = prompt_budget.generate(self.vision_model, 'image_text', [prompt, self.prepare_image(image)])
             
             return {
                 'extracted_text': response.text if response.text else "No text found in image."
@@ -82,16 +196,16 @@ Please be thorough but concise in your analysis."""
                 'extracted_text': f'Text extraction failed: {str(e)}'
             }
     
-    def detect_objects(self, image_path):
+    def detect_objects(self, image_source):
         """Detect and list objects in the image"""
         try:
-            image = Image.open(image_path)
+            image = self.load_image(image_source)
             
             prompt = """List all identifiable objects, people, animals, or items in this image.
             Format as a bulleted list with brief descriptions.
             Also provide a count of main objects detected."""
             
-            response = self.vision_model.generate_content([prompt, image])
+            response = prompt_budget.generate(self.vision_model, 'image_objects', [prompt, self.prepare_image(image)])
             
             return {
                 'objects_detected': response.text if response.text else "No objects detected."
@@ -0,0 +1,238 @@
+import os
+import json
+import queue
+import atexit
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from .tracing import tracer
+
+# Memory entries written before users were tracked
+DEFAULT_USER = 'anonymous'
+
+class SQLiteStore:
+    """Base for the SQLite-backed stores: one connection per thread, in WAL mode"""
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+    
+    def _connect(self):
+        """One connection per thread; WAL lets readers run alongside the writer"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+class SQLiteMemoryStore(SQLiteStore):
+    """Append-only conversation memory in SQLite (WAL mode), partitioned per user"""
+    
+    def __init__(self, db_path, retention=50):
+        super().__init__(db_path)
+        self.retention = retention
+        
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_memory (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                transcript TEXT,
+                speakers INTEGER,
+                duration REAL,
+                summary TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_conversation_memory_user
+            ON conversation_memory (user_id, id DESC)
+        """)
+        conn.commit()
+    
+    def append(self, user_id, entry):
+        """Atomically add an entry and trim the user's history to the retention limit"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """INSERT INTO conversation_memory (user_id, timestamp, transcript, speakers, duration, summary)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (user_id, entry.get('timestamp', datetime.now().isoformat()), entry.get('transcript', ''),
+                 entry.get('speakers', 1), entry.get('duration', 0), entry.get('summary', ''))
+            )
+            conn.execute(
+                """DELETE FROM conversation_memory
+                   WHERE user_id = ? AND id <= (
+                       SELECT id FROM conversation_memory WHERE user_id = ?
+                       ORDER BY id DESC LIMIT 1 OFFSET ?
+                   )""",
+                (user_id, user_id, self.retention)
+            )
+    
+    def recent(self, user_id, limit=5):
+        """Last N entries for a user, oldest first"""
+        rows = self._connect().execute(
+            """SELECT timestamp, transcript, speakers, duration, summary FROM conversation_memory
+               WHERE user_id = ? ORDER BY id DESC LIMIT ?""",
+            (user_id, limit)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+    
+    def is_empty(self):
+        return self._connect().execute('SELECT 1 FROM conversation_memory LIMIT 1').fetchone() is None
+
+class MongoMemoryStore:
+    """Conversation memory in MongoDB for production deployments"""
+    
+    def __init__(self, uri, db_name='ai_playground', retention=50):
+        from pymongo import MongoClient, DESCENDING
+        
+        self.retention = retention
+        self.sort_order = DESCENDING
+        self.collection = MongoClient(uri)[db_name]['conversation_memory']
+        self.collection.create_index([('user_id', 1), ('created_at', DESCENDING)])
+    
+    def append(self, user_id, entry):
+        """Add an entry and trim the user's history to the retention limit"""
+        self.collection.insert_one({**entry, 'user_id': user_id, 'created_at': datetime.utcnow()})
+        
+        stale = self.collection.find({'user_id': user_id}, {'_id': 1}) \
+            .sort('created_at', self.sort_order).skip(self.retention)
+        stale_ids = [doc['_id'] for doc in stale]
+        if stale_ids:
+            self.collection.delete_many({'_id': {'$in': stale_ids}})
+    
+    def recent(self, user_id, limit=5):
+        """Last N entries for a user, oldest first"""
+        docs = self.collection.find({'user_id': user_id}, {'_id': 0, 'user_id': 0, 'created_at': 0}) \
+            .sort('created_at', self.sort_order).limit(limit)
+        return list(reversed(list(docs)))
+    
+    def is_empty(self):
+        return self.collection.find_one({}, {'_id': 1}) is None
+
+class MemoryWriter:
+    """Write-behind stage that summarizes finished conversations off the response path"""
+    
+    def __init__(self, store, summarize_batch, max_queue=100, batch_size=8, flush_interval=2.0):
+        self.store = store
+        self.summarize_batch = summarize_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_queue)
+        self.fallback_summary = "Conversation analyzed"
+        self.closed = False
+        self.lock = threading.Lock()
+        
+        self.thread = threading.Thread(target=self._run, name='memory-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, user_id, entry, transcript):
+        """Queue an entry for summarization; when the queue is full it is stored unsummarized"""
+        try:
+            with self.lock:
+                closed = self.closed
+                if not closed:
+                    self.pending.put_nowait((user_id, entry, transcript))
+        except queue.Full:
+            print("Memory writer queue full, storing entry without summary")
+            self._write([(user_id, entry, transcript)], [self.fallback_summary])
+            return
+        
+        # A request that outlived a configuration reload writes through instead of queueing
+        if closed:
+            self._flush([(user_id, entry, transcript)])
+    
+    def _run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            
+            # Gather whatever else arrives shortly so one model call covers the batch
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.pending.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            self._flush(batch)
+            if stopping:
+                return
+    
+    def _flush(self, batch):
+        # One model call per user: summaries are matched back by position, so a reordered
+        # or merged reply must never put one user's summary into another user's memory
+        by_user = {}
+        for item in batch:
+            by_user.setdefault(item[0], []).append(item)
+        
+        for items in by_user.values():
+            try:
+                with tracer.span('memory.summarize_batch'):
+                    summaries = self.summarize_batch([transcript for _, _, transcript in items])
+            except Exception as e:
+                print(f"Error summarizing memory batch: {e}")
+                summaries = [self.fallback_summary] * len(items)
+            self._write(items, summaries)
+    
+    def _write(self, batch, summaries):
+        for (user_id, entry, _), summary in zip(batch, summaries):
+            try:
+                self.store.append(user_id, {**entry, 'summary': summary})
+            except Exception as e:
+                print(f"Error saving to memory: {e}")
+    
+    def close(self, timeout=30):
+        """Drain queued entries before shutdown"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.pending.put(None)
+        self.thread.join(timeout)
+
+def import_legacy_memory(store, json_path, user_id=DEFAULT_USER):
+    """Move entries from the old conversation_memory.json file into an empty store"""
+    try:
+        if os.path.exists(json_path) and store.is_empty():
+            with open(json_path, 'r') as f:
+                for entry in json.load(f):
+                    store.append(user_id, entry)
+    except Exception as e:
+        print(f"Error importing legacy memory: {e}")
+
+def open_sqlite_store(store_class, db_path, *args):
+    """SQLite store at db_path, or in the temp directory when that path is read-only (e.g. on Vercel)"""
+    try:
+        return store_class(db_path, *args)
+    except (sqlite3.Error, OSError) as e:
+        fallback = os.path.join(tempfile.gettempdir(), os.path.basename(db_path))
+        print(f"Error opening {db_path}, using {fallback} (set MONGODB_URI for persistent storage): {e}")
+        return store_class(fallback, *args)
+
+def create_memory_store():
+    """MongoDB when MONGODB_URI is set, otherwise a local SQLite file"""
+    retention = int(os.getenv('MEMORY_RETENTION', '50'))
+    mongo_uri = os.getenv('MONGODB_URI')
+    if mongo_uri:
+        store = MongoMemoryStore(mongo_uri, os.getenv('MONGODB_DB', 'ai_playground'), retention)
+    else:
+        store = open_sqlite_store(SQLiteMemoryStore, os.getenv('MEMORY_DB_PATH', 'conversation_memory.db'), retention)
+    
+    import_legacy_memory(store, 'conversation_memory.json')
+    return store
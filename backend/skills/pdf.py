@@ -0,0 +1,103 @@
+import os
+import threading
+import multiprocessing
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+
+from .sources import open_source
+from .tracing import tracer
+
+# Shared process pool for page extraction, started on the first large PDF
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Process pool for text extraction; PyPDF2 is pure Python, so threads would serialize on the GIL"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = int(os.getenv('PDF_WORKERS', '0')) or min(4, os.cpu_count() or 1)
+            # spawn, because forking a process that already runs request threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=_pool_workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def extract_page_range(path, start, stop):
+    """Text of pages [start, stop) of a PDF on disk; runs inside a pool worker"""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+class PdfPages:
+    """Lazy page-text stream over a PDF; large documents are extracted across a process pool"""
+    
+    def __init__(self, source, parallel_threshold=None, batch_pages=None):
+        from PyPDF2 import PdfReader
+        
+        self.source = source
+        self.parallel_threshold = parallel_threshold or int(os.getenv('PDF_PARALLEL_PAGES', '40'))
+        self.batch_pages = batch_pages or int(os.getenv('PDF_BATCH_PAGES', '16'))
+        
+        # The reader is kept open for in-process extraction of smaller documents
+        self.resources = ExitStack()
+        self.reader = PdfReader(self.resources.enter_context(open_source(source)))
+        self.num_pages = len(self.reader.pages)
+        self.iterator = None
+    
+    def _sequential(self):
+        for page in self.reader.pages:
+            yield page.extract_text() or ''
+    
+    def _parallel(self):
+        # Workers reopen the file, so uploads held in memory are materialized once
+        path = self.source if isinstance(self.source, (str, os.PathLike)) else self.source.path()
+        try:
+            pool = get_pool()
+        except (OSError, NotImplementedError) as e:
+            # e.g. serverless runtimes without multiprocessing support
+            print(f"PDF process pool unavailable, extracting in-process: {e}")
+            yield from self._sequential()
+            return
+        
+        # Keep only a few batches in flight so an early stop wastes little work
+        in_flight = max(2, _pool_workers * 2)
+        batches = [(start, min(start + self.batch_pages, self.num_pages))
+                   for start in range(0, self.num_pages, self.batch_pages)]
+        futures = []
+        try:
+            for start, stop in batches[:in_flight]:
+                futures.append(pool.submit(extract_page_range, path, start, stop))
+            next_batch = len(futures)
+            
+            while futures:
+                pages = futures.pop(0).result()
+                if next_batch < len(batches):
+                    futures.append(pool.submit(extract_page_range, path, *batches[next_batch]))
+                    next_batch += 1
+                yield from pages
+        finally:
+            # Runs when the consumer stops early, too
+            for future in futures:
+                future.cancel()
+    
+    def _generate(self):
+        try:
+            with tracer.span('pdf.extract') as span:
+                if self.num_pages >= self.parallel_threshold:
+                    yield from self._parallel()
+                else:
+                    yield from self._sequential()
+                span.set(pages=self.num_pages)
+        finally:
+            self.resources.close()
+    
+    def __iter__(self):
+        if self.iterator is None:
+            self.iterator = self._generate()
+        return self.iterator
+    
+    def close(self):
+        """Stop extraction early: cancels queued page batches and releases the file"""
+        if self.iterator is not None:
+            self.iterator.close()
+        self.resources.close()
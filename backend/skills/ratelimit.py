@@ -0,0 +1,55 @@
+import os
+import time
+import threading
+
+class RateLimiter:
+    """Process-wide token bucket; acquire() blocks until a call is allowed"""
+    
+    def __init__(self, per_minute=0, burst=None):
+        self.enabled = per_minute > 0
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or max(1, per_minute // 10)) if self.enabled else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited_seconds = 0.0
+    
+    def acquire(self):
+        """Take one token, sleeping outside the lock while the bucket refills"""
+        if not self.enabled:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited_seconds += wait
+            time.sleep(wait)
+
+class RateLimitedModel:
+    """Model handle that takes a token from a limiter before every generate_content call"""
+    
+    def __init__(self, model, limiter):
+        self.model = model
+        self.limiter = limiter
+    
+    def generate_content(self, *args, **kwargs):
+        self.limiter.acquire()
+        return self.model.generate_content(*args, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+def limiter_from_env(name):
+    """RateLimiter from {name}_RPM and {name}_BURST; unset or 0 means unlimited"""
+    per_minute = int(os.getenv(f'{name}_RPM', '0'))
+    burst = int(os.getenv(f'{name}_BURST', '0')) or None
+    return RateLimiter(per_minute, burst)
+
+# Shared by every analyzer, job and batch worker in the process
+gemini_limiter = limiter_from_env('GEMINI')
+lemonfox_limiter = limiter_from_env('LEMONFOX')
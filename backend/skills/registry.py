@@ -0,0 +1,115 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+from .tracing import tracer, record_usage
+from .ratelimit import RateLimitedModel, gemini_limiter
+from .budget import prompt_budget, budgets_from_env
+
+# Marks a registry that has not configured the Gemini client yet
+_UNCONFIGURED = object()
+
+class TracedModel:
+    """Model handle that records a span, with token usage, for every generate_content call"""
+    
+    def __init__(self, model, model_name):
+        self.model = model
+        self.stage = f'gemini.{model_name}'
+    
+    def generate_content(self, *args, **kwargs):
+        with tracer.span(self.stage) as span:
+            response = self.model.generate_content(*args, **kwargs)
+            record_usage(span, response)
+            return response
+    
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+def traced_model(model, model_name):
+    """Wrap a model handle only while tracing is on, so disabled tracing costs nothing per call"""
+    return TracedModel(model, model_name) if tracer.enabled else model
+
+def wrap_model(model, model_name):
+    """Tracing inside the rate limit, so time spent waiting for a token is not billed to Gemini"""
+    model = traced_model(model, model_name)
+    return RateLimitedModel(model, gemini_limiter) if gemini_limiter.enabled else model
+
+class SkillRegistry:
+    """Process-wide, thread-safe home for the skill analyzers and Gemini model handles"""
+    
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.models = {}
+        self.analyzers = {}
+        self.configured_key = _UNCONFIGURED
+    
+    def _configure(self):
+        """Configure the Gemini client once per API key (lock must be held)"""
+        # The Gemini SDK is slow to import, so it is loaded with the first model handle
+        import google.generativeai as genai
+        
+        api_key = os.getenv('GEMINI_API_KEY')
+        if api_key != self.configured_key:
+            genai.configure(api_key=api_key)
+            self.configured_key = api_key
+            self.models.clear()
+    
+    def get_model(self, model_name):
+        """Return the shared GenerativeModel for a model name, building it on first use"""
+        model = self.models.get(model_name)
+        if model is not None:
+            return model
+        
+        with self.lock:
+            self._configure()
+            if model_name not in self.models:
+                import google.generativeai as genai
+                self.models[model_name] = wrap_model(genai.GenerativeModel(model_name), model_name)
+            return self.models[model_name]
+    
+    def set_model(self, model_name, model):
+        """Install a model handle explicitly, e.g. a stand-in for local runs"""
+        with self.lock:
+            self._configure()
+            self.models[model_name] = wrap_model(model, model_name)
+    
+    def _get_analyzer(self, name, factory):
+        analyzer = self.analyzers.get(name)
+        if analyzer is not None:
+            return analyzer
+        
+        with self.lock:
+            if name not in self.analyzers:
+                self.analyzers[name] = factory()
+            return self.analyzers[name]
+    
+    def conversation_analyzer(self):
+        from .conversation import ConversationAnalyzer
+        return self._get_analyzer('conversation', ConversationAnalyzer)
+    
+    def image_analyzer(self):
+        from .image import ImageAnalyzer
+        return self._get_analyzer('image', ImageAnalyzer)
+    
+    def document_summarizer(self):
+        from .summarization import DocumentSummarizer
+        return self._get_analyzer('summarize', DocumentSummarizer)
+    
+    def reload(self):
+        """Re-read .env and the environment: prompt budgets now, analyzers and models on next use"""
+        load_dotenv(override=True)
+        prompt_budget.configure(budgets_from_env())
+        with self.lock:
+            self.configured_key = _UNCONFIGURED
+            self.models.clear()
+            retired = list(self.analyzers.values())
+            self.analyzers.clear()
+        
+        # Requests already running finish on the analyzer they started with
+        for analyzer in retired:
+            close = getattr(analyzer, 'close', None)
+            if close is not None:
+                close()
+
+# Shared by every route in the process
+registry = SkillRegistry()
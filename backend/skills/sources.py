@@ -0,0 +1,40 @@
+import os
+from contextlib import contextmanager
+
+from .cache import hash_file
+
+# Analyzer inputs are either a filesystem path or an upload object exposing
+# open(), sha256, size and extension (see uploads.Upload in the backend)
+
+def source_extension(source):
+    """Lower-case file extension without the dot, or None"""
+    if isinstance(source, (str, os.PathLike)):
+        name = os.fspath(source)
+        return name.rsplit('.', 1)[1].lower() if '.' in os.path.basename(name) else None
+    return getattr(source, 'extension', None)
+
+def source_hash(source):
+    """SHA-256 of the input bytes; uploads hash while they are received"""
+    if isinstance(source, (str, os.PathLike)):
+        return hash_file(source)
+    return source.sha256
+
+def source_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return source.size
+
+@contextmanager
+def open_source(source):
+    """Binary file object positioned at the start of the input"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield f
+    else:
+        yield source.open()
+
+def source_path(source):
+    """Filesystem path of the input; uploads are materialized to a temp file once"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return source.path()
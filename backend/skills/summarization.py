@@ -1,61 +1,107 @@
 import os
-import google.generativeai as genai
-import PyPDF2
-from docx import Document
-import requests
-from bs4 import BeautifulSoup
+from itertools import chain
 from urllib.parse import urlparse
-import tempfile
+
+from .cache import result_cache, normalize_url, is_cacheable
+from .chunking import PAGE_BREAK, chunk_text, chunk_stream, content_hash
+from .pdf import PdfPages
+from .httpclient import http_client
+from .sources import open_source, source_extension, source_hash
+from .registry import registry
+from .tracing import tracer
+from .budget import prompt_budget
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 class DocumentSummarizer:
+    # Bump when prompts or result shape change so cached results are not reused
+    PROMPT_VERSION = 'summarize-v6'
+    
     def __init__(self):
-        # Initialize Gemini for summarization
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # Gemini for summarization, built lazily by the shared registry
+        self.model_name = 'gemini-2.5-flash'
+        
+        # Shared result cache keyed on the upload bytes or the normalized URL
+        self.cache = result_cache
+        
+        # The three summary calls share the extracted text but not each other's output,
+        # so they are fanned out together instead of run back to back
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SUMMARY_WORKERS', '6')),
+            thread_name_prefix='summary'
+        )
+        self.call_timeout = float(os.getenv('SUMMARY_CALL_TIMEOUT', '60'))
+        
+        # 'auto' switches to map-reduce once the text no longer fits the single-pass prompt,
+        # 'single' always truncates, 'map_reduce' always chunks
+        self.mode = os.getenv('SUMMARY_MODE', 'auto')
+        self.chunk_chars = int(os.getenv('SUMMARY_CHUNK_CHARS', '12000'))
+        self.reduce_chars = int(os.getenv('SUMMARY_REDUCE_CHARS', '30000'))
+        
+        # Chunk summaries get their own bounded pool so one large document
+        # doesn't queue every other request's calls behind it
+        self.map_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SUMMARY_MAP_WORKERS', '4')),
+            thread_name_prefix='summary-map'
+        )
+        
+        # Pages are fetched through the shared pooled client
+        self.http = http_client
+        
+        # Token budgets replace fixed character cutoffs and record usage per call
+        self.budget = prompt_budget
+    
+    @property
+    def model(self):
+        return registry.get_model(self.model_name)
+    
+    def extract_pdf_pages(self, pdf_source):
+        """Lazy stream of page texts, so summarization can start before extraction finishes"""
+        try:
+            return PdfPages(pdf_source)
+        except Exception as e:
+            raise Exception(f"Error extracting PDF text: {str(e)}")
     
-    def extract_text_from_pdf(self, pdf_path):
+    def extract_text_from_pdf(self, pdf_source):
         """Extract text from PDF file"""
+        pages = self.extract_pdf_pages(pdf_source)
         try:
-            text = ""
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                num_pages = len(pdf_reader.pages)
-                
-                for page_num in range(num_pages):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
-            
-            return text, num_pages
+            # Pages are collected and joined once, separated by page breaks
+            text = PAGE_BREAK.join(page + "\n" for page in pages)
+            return text, pages.num_pages
         except Exception as e:
             raise Exception(f"Error extracting PDF text: {str(e)}")
     
-    def extract_text_from_docx(self, docx_path):
+    @tracer.traced('summarize.extract_docx')
+    def extract_text_from_docx(self, docx_source):
         """Extract text from DOCX file"""
         try:
-            doc = Document(docx_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+            from docx import Document
+            
+            with open_source(docx_source) as file:
+                doc = Document(file)
+            parts = [paragraph.text + "\n" for paragraph in doc.paragraphs]
             
             # Also extract text from tables
             for table in doc.tables:
                 for row in table.rows:
-                    for cell in row.cells:
-                        text += cell.text + "\t"
-                    text += "\n"
+                    parts.extend(cell.text + "\t" for cell in row.cells)
+                    parts.append("\n")
             
-            return text
+            return ''.join(parts)
         except Exception as e:
             raise Exception(f"Error extracting DOCX text: {str(e)}")
     
-    def extract_text_from_txt(self, txt_path):
+    @tracer.traced('summarize.extract_txt')
+    def extract_text_from_txt(self, txt_source):
         """Extract text from TXT file"""
         try:
-            with open(txt_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            with open_source(txt_source) as file:
+                return file.read().decode('utf-8')
         except Exception as e:
             raise Exception(f"Error reading TXT file: {str(e)}")
     
+    @tracer.traced('summarize.fetch_url')
     def extract_text_from_url(self, url):
         """Extract text content from URL"""
         try:
@@ -63,10 +109,11 @@ class DocumentSummarizer:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.http.get(url, endpoint='url.fetch', headers=headers, timeout=(5, 10))
             response.raise_for_status()
             
             # Parse HTML content
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(response.text, 'html.parser')
             
             # Remove script and style elements
@@ -88,15 +135,12 @@ class DocumentSummarizer:
         except Exception as e:
             raise Exception(f"Error extracting URL content: {str(e)}")
     
-    def generate_summary(self, text, content_type="document"):
-        """Generate summary using Gemini"""
-        try:
-            # Truncate text if too long (Gemini has token limits)
-            max_chars = 30000
-            if len(text) > max_chars:
-                text = text[:max_chars] + "...[content truncated]"
-            
-            prompt = f"""Please provide a comprehensive summary of the following {content_type}:
+    def build_summary_prompt(self, text, content_type="document", max_tokens=None):
+        """Build the detailed summary prompt"""
+        # Trim text to the call's token budget
+        text = self.budget.fit('summary', text, max_tokens)
+        
+        return f"""Please provide a comprehensive summary of the following {content_type}:
 
 1. **Main Topics**: What are the key topics or themes covered?
 2. **Key Points**: List the most important points or findings (bullet points)
@@ -108,43 +152,43 @@ Content to summarize:
 {text}
 
 Please be thorough but concise, focusing on the most important information."""
-            
-            response = self.model.generate_content(prompt)
+    
+    def generate_summary(self, text, content_type="document"):
+        """Generate summary using Gemini"""
+        try:
+            response = self.budget.generate(self.model, 'summary', self.build_summary_prompt(text, content_type))
             
             return response.text if response.text else "Unable to generate summary."
             
         except Exception as e:
             return f"Summary generation failed: {str(e)}"
     
-    def generate_brief_summary(self, text):
-        """Generate a brief summary"""
-        try:
-            # Truncate text if too long
-            max_chars = 10000
-            if len(text) > max_chars:
-                text = text[:max_chars] + "...[content truncated]"
-            
-            prompt = f"""Provide a brief 3-4 sentence summary of the following content, 
+    def build_brief_prompt(self, text, max_tokens=None):
+        """Build the brief summary prompt"""
+        # Trim text to the call's token budget
+        text = self.budget.fit('brief_summary', text, max_tokens)
+        
+        return f"""Provide a brief 3-4 sentence summary of the following content, 
             highlighting only the most essential information:
             
             {text}"""
-            
-            response = self.model.generate_content(prompt)
+    
+    def generate_brief_summary(self, text):
+        """Generate a brief summary"""
+        try:
+            response = self.budget.generate(self.model, 'brief_summary', self.build_brief_prompt(text))
             
             return response.text if response.text else "Unable to generate brief summary."
             
         except Exception as e:
             return f"Brief summary generation failed: {str(e)}"
     
-    def extract_key_entities(self, text):
-        """Extract key entities from text"""
-        try:
-            # Truncate text if too long
-            max_chars = 10000
-            if len(text) > max_chars:
-                text = text[:max_chars]
-            
-            prompt = f"""Extract and list the following from the text:
+    def build_entities_prompt(self, text, max_tokens=None):
+        """Build the key entity extraction prompt"""
+        # Trim text to the call's token budget
+        text = self.budget.fit('key_entities', text, max_tokens, marker='')
+        
+        return f"""Extract and list the following from the text:
             1. Key people/names mentioned
             2. Organizations/companies
             3. Locations/places
@@ -154,51 +198,246 @@ Please be thorough but concise, focusing on the most important information."""
             Format as categorized lists.
             
             Text: {text}"""
-            
-            response = self.model.generate_content(prompt)
+    
+    def extract_key_entities(self, text):
+        """Extract key entities from text"""
+        try:
+            response = self.budget.generate(self.model, 'key_entities', self.build_entities_prompt(text))
             
             return response.text if response.text else "No entities extracted."
             
         except Exception as e:
             return f"Entity extraction failed: {str(e)}"
     
-    def summarize_document(self, file_path):
+    def _generate_text(self, call, prompt, empty_message):
+        """Run one Gemini call bounded by the per-call timeout and the call's output budget"""
+        response = self.budget.generate(self.model, call, prompt, request_options={'timeout': self.call_timeout})
+        return response.text if response.text else empty_message
+    
+    @tracer.traced('summarize.generate')
+    def generate_all_summaries(self, text, content_type="document", max_tokens=None):
+        """Run the detailed summary, brief summary and entity extraction concurrently"""
+        # max_tokens overrides the per-call input budgets, e.g. for already condensed chunk summaries
+        calls = {
+            'detailed_summary': ('summary', self.build_summary_prompt(text, content_type, max_tokens),
+                                 "Unable to generate summary.", "Summary generation failed"),
+            'brief_summary': ('brief_summary', self.build_brief_prompt(text, max_tokens),
+                              "Unable to generate brief summary.", "Brief summary generation failed"),
+            'key_entities': ('key_entities', self.build_entities_prompt(text, max_tokens),
+                             "No entities extracted.", "Entity extraction failed")
+        }
+        
+        futures = {
+            key: self.executor.submit(self._generate_text, call, prompt, empty_message)
+            for key, (call, prompt, empty_message, _) in calls.items()
+        }
+        
+        # All calls start together, so one shared deadline is a per-call timeout
+        deadline = time.monotonic() + self.call_timeout
+        results = {}
+        failed = []
+        for key, future in futures.items():
+            failure_message = calls[key][3]
+            try:
+                results[key] = future.result(timeout=max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                results[key] = f"{failure_message}: timed out after {self.call_timeout:g}s"
+                failed.append(key)
+            except Exception as e:
+                results[key] = f"{failure_message}: {str(e)}"
+                failed.append(key)
+        
+        # Keep whatever succeeded and flag the sections that did not
+        if failed:
+            results['partial'] = True
+            results['failed_sections'] = failed
+        
+        return results
+    
+    def build_chunk_prompt(self, chunk, index, content_type="document"):
+        """Build the prompt that condenses one chunk during the map step"""
+        chunk = self.budget.fit('chunk_notes', chunk)
+        return f"""This is part {index + 1} of a longer {content_type}.
+            Summarize this part in detailed notes that will later be merged with the notes for the other parts:
+            - the main topics and key points or findings
+            - notable insights and conclusions
+            - people, organizations, locations, dates and key technical terms mentioned
+            
+            Do not add an introduction or refer to other parts.
+            
+            Content:
+            {chunk}"""
+    
+    @tracer.traced('summarize.map')
+    def summarize_chunks(self, chunks, content_type="document"):
+        """Map step: summarize chunks in parallel, reusing chunk summaries cached by content hash"""
+        # chunks may be a lazy stream; each chunk is submitted as soon as it is available
+        notes = []
+        pending = {}
+        for index, chunk in enumerate(chunks):
+            notes.append(None)
+            key = self.cache.make_key('summarize_chunk', content_hash(chunk), self.PROMPT_VERSION, self.model_name)
+            cached = self.cache.get(key)
+            if cached is not None:
+                notes[index] = cached
+            else:
+                prompt = self.build_chunk_prompt(chunk, index, content_type)
+                pending[index] = (key, self.map_executor.submit(self._generate_text, 'chunk_notes', prompt, ''))
+        
+        failed = []
+        for index, (key, future) in pending.items():
+            try:
+                notes[index] = future.result()
+            except Exception as e:
+                print(f"Error summarizing chunk {index + 1}/{len(notes)}: {e}")
+                failed.append(index)
+                continue
+            if notes[index]:
+                self.cache.set(key, notes[index])
+        
+        return notes, failed
+    
+    def map_reduce_summaries(self, texts, content_type="document"):
+        """Summarize text of any length: chunk on page/section boundaries, summarize chunks, reduce"""
+        # Accepts one text or a stream of page/section texts
+        if isinstance(texts, str):
+            texts = [texts]
+        notes, failed = self.summarize_chunks(chunk_stream(texts, self.chunk_chars), content_type)
+        sections = [f"[Part {i + 1}]\n{note}" for i, note in enumerate(notes) if note]
+        if not sections:
+            raise Exception("every chunk summary failed")
+        
+        # Collapse the notes further while they are still too long for one reduce prompt
+        combined = '\n\n'.join(sections)
+        for _ in range(3):
+            if len(combined) <= self.reduce_chars:
+                break
+            groups = chunk_text(combined, self.chunk_chars)
+            if len(groups) >= len(sections):
+                break
+            group_notes, _ = self.summarize_chunks(groups, f"set of section notes for a {content_type}")
+            sections = [note for note in group_notes if note] or sections
+            combined = '\n\n'.join(sections)
+        
+        results = self.generate_all_summaries(
+            combined, f"{content_type}, given as notes on each of its consecutive parts",
+            max_tokens=self.budget.estimator.tokens_for(self.reduce_chars)
+        )
+        results['summary_mode'] = 'map_reduce'
+        results['chunk_count'] = len(notes)
+        
+        # Missing chunks mean the summary doesn't cover the whole document
+        if failed:
+            results['partial'] = True
+            results['failed_chunks'] = [index + 1 for index in failed]
+        
+        return results
+    
+    def cache_variant(self):
+        """Prompt version plus the settings that change what a summary covers"""
+        budgets = ','.join(str(self.budget.limits(call)) for call in ('summary', 'brief_summary', 'key_entities'))
+        return f"{self.PROMPT_VERSION}:{self.mode}:{self.chunk_chars}:{self.reduce_chars}:{budgets}"
+    
+    def summarize_text(self, text, content_type="document"):
+        """Single pass for text that fits the prompt, map-reduce for anything longer"""
+        summaries, _ = self.summarize_units([text], content_type)
+        return summaries
+    
+    def summarize_units(self, units, content_type="document"):
+        """Summarize a stream of page/section texts, reading only as much as the summary mode needs"""
+        stats = {'word_count': 0, 'character_count': 0}
+        
+        def counted():
+            try:
+                for unit in units:
+                    stats['word_count'] += len(unit.split())
+                    stats['character_count'] += len(unit)
+                    yield unit
+            finally:
+                # Stops extraction when the single-pass mode has read enough
+                close = getattr(units, 'close', None)
+                if close:
+                    close()
+        
+        stream = counted()
+        head = []
+        size = 0
+        for unit in stream:
+            head.append(unit)
+            size += len(unit)
+            if size > self.reduce_chars:
+                break
+        
+        if self.mode == 'map_reduce' or (self.mode == 'auto' and size > self.reduce_chars):
+            # Chunk summaries start while the rest of the document is still being extracted
+            summaries = self.map_reduce_summaries(chain(head, stream), content_type)
+        else:
+            stream.close()
+            summaries = self.generate_all_summaries(PAGE_BREAK.join(head), content_type)
+            if size > self.reduce_chars:
+                # Single-pass mode stopped reading once the prompt was full, so word_count and
+                # character_count cover the text that was read; truncated tells the client so
+                summaries['truncated'] = True
+        
+        return summaries, stats
+    
+    def summarize_document(self, source):
         """Main function to summarize documents"""
+        pages = None
         try:
             # Determine file type and extract text
-            file_ext = file_path.split('.')[-1].lower()
+            file_ext = source_extension(source) or ''
+            
+            cache_key = self.cache.make_key('summarize_document', f"{file_ext}:{source_hash(source)}",
+                                            self.cache_variant(), self.model_name)
+            cached = self.cache.get(cache_key)
+            tracer.record_cache('summarize_document', cached is not None)
+            if cached is not None:
+                return cached
             
             if file_ext == 'pdf':
-                text, num_pages = self.extract_text_from_pdf(file_path)
-                metadata = {'type': 'PDF', 'pages': num_pages}
+                pages = self.extract_pdf_pages(source)
+                units = (page + "\n" for page in pages)
+                metadata = {'type': 'PDF', 'pages': pages.num_pages}
             elif file_ext in ['doc', 'docx']:
-                text = self.extract_text_from_docx(file_path)
+                units = [self.extract_text_from_docx(source)]
                 metadata = {'type': 'Word Document'}
             elif file_ext == 'txt':
-                text = self.extract_text_from_txt(file_path)
+                units = [self.extract_text_from_txt(source)]
                 metadata = {'type': 'Text File'}
             else:
                 return {'error': f'Unsupported file type: {file_ext}'}
             
-            if not text or len(text.strip()) < 10:
+            # Peek until there is enough text to tell an empty document from a real one
+            units = iter(units)
+            head = []
+            for unit in units:
+                head.append(unit)
+                if len(''.join(head).strip()) >= 10:
+                    break
+            if len(''.join(head).strip()) < 10:
                 return {'error': 'Document appears to be empty or contains no extractable text'}
             
-            # Generate summaries
-            detailed_summary = self.generate_summary(text, "document")
-            brief_summary = self.generate_brief_summary(text)
-            key_entities = self.extract_key_entities(text)
+            # Generate summaries while the rest of the pages are extracted
+            summaries, stats = self.summarize_units(chain(head, units), "document")
             
-            return {
+            result = {
                 'metadata': metadata,
-                'word_count': len(text.split()),
-                'character_count': len(text),
-                'brief_summary': brief_summary,
-                'detailed_summary': detailed_summary,
-                'key_entities': key_entities
+                **stats,
+                **summaries
             }
             
+            if is_cacheable(result):
+                self.cache.set(cache_key, result)
+            
+            return result
+            
         except Exception as e:
             return {'error': f'Document summarization failed: {str(e)}'}
+        finally:
+            if pages is not None:
+                pages.close()
     
     def summarize_url(self, url):
         """Summarize content from URL"""
@@ -208,6 +447,13 @@ Please be thorough but concise, focusing on the most important information."""
             if not parsed.scheme or not parsed.netloc:
                 return {'error': 'Invalid URL format'}
             
+            cache_key = self.cache.make_key('summarize_url', normalize_url(url),
+                                            self.cache_variant(), self.model_name)
+            cached = self.cache.get(cache_key)
+            tracer.record_cache('summarize_url', cached is not None)
+            if cached is not None:
+                return cached
+            
             # Extract text from URL
             text, title = self.extract_text_from_url(url)
             
@@ -215,19 +461,20 @@ Please be thorough but concise, focusing on the most important information."""
                 return {'error': 'Unable to extract meaningful content from URL'}
             
             # Generate summaries
-            detailed_summary = self.generate_summary(text, "webpage")
-            brief_summary = self.generate_brief_summary(text)
-            key_entities = self.extract_key_entities(text)
+            summaries = self.summarize_text(text, "webpage")
             
-            return {
+            result = {
                 'url': url,
                 'title': title,
                 'word_count': len(text.split()),
                 'character_count': len(text),
-                'brief_summary': brief_summary,
-                'detailed_summary': detailed_summary,
-                'key_entities': key_entities
+                **summaries
             }
             
+            if is_cacheable(result):
+                self.cache.set(cache_key, result)
+            
+            return result
+            
         except Exception as e:
             return {'error': f'URL summarization failed: {str(e)}'}
@@ -0,0 +1,202 @@
+import os
+import time
+import threading
+from functools import wraps
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+METRICS = {
+    'skill_stage_duration_seconds': ('histogram', 'Time spent in each traced stage'),
+    'skill_stage_errors_total': ('counter', 'Traced stages that raised'),
+    'skill_payload_bytes_total': ('counter', 'Bytes handled by each stage'),
+    'skill_tokens_total': ('counter', 'Model tokens used by each stage'),
+    'skill_cache_lookups_total': ('counter', 'Result cache lookups by skill and outcome'),
+    'http_request_duration_seconds': ('histogram', 'API request latency by route')
+}
+
+class NullSpan:
+    """Shared do-nothing span handed out while tracing is disabled"""
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+    
+    def set(self, **attrs):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    """Times one stage; attributes such as bytes or tokens are added with set()"""
+    __slots__ = ('tracer', 'name', 'attrs', 'start')
+    
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        # A generator closed by its consumer is an early stop, not a failure
+        failed = exc_type is not None and not issubclass(exc_type, GeneratorExit)
+        self.tracer._finish(self, time.perf_counter() - self.start, failed)
+        return False
+    
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+class Tracer:
+    """Minimal span recorder that aggregates into Prometheus metrics and per-request timings"""
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = []
+        self.local = threading.local()
+    
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attrs)
+    
+    def traced(self, name):
+        """Decorator form of span() for whole functions"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, name, {}):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def _finish(self, span, seconds, failed):
+        stage = (('stage', span.name),)
+        with self.lock:
+            self._observe('skill_stage_duration_seconds', stage, seconds)
+            if failed:
+                self._increment('skill_stage_errors_total', stage, 1)
+            if span.attrs.get('bytes'):
+                self._increment('skill_payload_bytes_total', stage, span.attrs['bytes'])
+            for direction in ('input', 'output'):
+                tokens = span.attrs.get(f'{direction}_tokens')
+                if tokens:
+                    self._increment('skill_tokens_total', stage + (('direction', direction),), tokens)
+        
+        # Spans on the request thread also go into the Server-Timing header
+        timings = getattr(self.local, 'timings', None)
+        if timings is not None:
+            timings.append((span.name, seconds))
+    
+    def _observe(self, metric, labels, seconds):
+        """Add one histogram observation (lock must be held)"""
+        key = (metric, labels)
+        entry = self.histograms.get(key)
+        if entry is None:
+            entry = self.histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[0][i] += 1
+        entry[1] += seconds
+        entry[2] += 1
+    
+    def _increment(self, metric, labels, amount):
+        key = (metric, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def record_cache(self, skill, hit):
+        if not self.enabled:
+            return
+        with self.lock:
+            self._increment('skill_cache_lookups_total',
+                            (('skill', skill), ('result', 'hit' if hit else 'miss')), 1)
+    
+    def observe_request(self, route, method, status, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            self._observe('http_request_duration_seconds',
+                          (('route', route), ('method', method), ('status', str(status))), seconds)
+    
+    def begin_request(self):
+        if self.enabled:
+            self.local.timings = []
+    
+    def end_request(self):
+        """Spans recorded on this thread since begin_request, as (name, seconds)"""
+        timings = getattr(self.local, 'timings', None)
+        self.local.timings = None
+        return timings or []
+    
+    def add_collector(self, collect):
+        """Register a callable returning (metric, type, help, [(labels dict, value)]) tuples for scrapes"""
+        self.collectors.append(collect)
+    
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in self.histograms.items()}
+            counters = dict(self.counters)
+        
+        lines = []
+        for metric, (kind, help_text) in METRICS.items():
+            if kind == 'histogram':
+                series = [(labels, value) for (name, labels), value in histograms.items() if name == metric]
+            else:
+                series = [(labels, value) for (name, labels), value in counters.items() if name == metric]
+            if not series:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, value in sorted(series):
+                if kind == 'histogram':
+                    buckets, total, count = value
+                    for bound, bucket_count in zip(BUCKETS, buckets):
+                        lines.append(f"{metric}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {bucket_count}")
+                    lines.append(f"{metric}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{metric}_sum{format_labels(labels)} {total:.6f}")
+                    lines.append(f"{metric}_count{format_labels(labels)} {count}")
+                else:
+                    lines.append(f"{metric}{format_labels(labels)} {value:g}")
+        
+        for collect in self.collectors:
+            try:
+                for metric, kind, help_text, samples in collect():
+                    lines.append(f"# HELP {metric} {help_text}")
+                    lines.append(f"# TYPE {metric} {kind}")
+                    for labels, value in samples:
+                        lines.append(f"{metric}{format_labels(tuple(sorted(labels.items())))} {value:g}")
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        
+        return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+def server_timing(timings):
+    """Server-Timing header value, durations in milliseconds"""
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+
+def record_usage(span, response):
+    """Copy Gemini token counts from a response onto a span, when the SDK reports them"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        span.set(input_tokens=getattr(usage, 'prompt_token_count', 0) or 0,
+                 output_tokens=getattr(usage, 'candidates_token_count', 0) or 0)
+
+# Shared by the skills and the app; TRACING_ENABLED=false keeps every span a no-op
+tracer = Tracer(enabled=os.getenv('TRACING_ENABLED', 'false').lower() == 'true')
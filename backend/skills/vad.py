@@ -0,0 +1,66 @@
+import numpy as np
+
+# WebRTC VAD accepts 10, 20 or 30 ms frames
+FRAME_MS = 30
+
+# Frames converted to 16-bit PCM at a time, so long or memory-mapped buffers are never copied whole
+BLOCK_FRAMES = 1000
+
+def frame_length(sample_rate, frame_ms=FRAME_MS):
+    return sample_rate * frame_ms // 1000
+
+def speech_frames(samples, sample_rate=16000, aggressiveness=2, frame_ms=FRAME_MS):
+    """Per-frame speech flags for a float32 mono buffer"""
+    import webrtcvad
+    vad = webrtcvad.Vad(aggressiveness)
+    frame_len = frame_length(sample_rate, frame_ms)
+    num_frames = len(samples) // frame_len
+    if num_frames == 0:
+        return np.zeros(0, dtype=bool)
+    
+    flags = np.empty(num_frames, dtype=bool)
+    for first in range(0, num_frames, BLOCK_FRAMES):
+        count = min(BLOCK_FRAMES, num_frames - first)
+        block = samples[first * frame_len:(first + count) * frame_len]
+        pcm = (np.clip(block, -1.0, 1.0) * 32767).astype('<i2')
+        frames = pcm.reshape(count, frame_len)
+        flags[first:first + count] = np.fromiter((vad.is_speech(frame.tobytes(), sample_rate) for frame in frames),
+                                                 dtype=bool, count=count)
+    return flags
+
+def runs(flags):
+    """Start and end indices (exclusive) of each run of True values"""
+    padded = np.concatenate(([0], flags.astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    return edges[0::2], edges[1::2]
+
+def split_on_silence(samples, sample_rate=16000, max_chunk_seconds=30, min_silence_ms=300, flags=None):
+    """Split audio at pauses into chunks no longer than max_chunk_seconds, as (start, end) sample ranges"""
+    if flags is None:
+        flags = speech_frames(samples, sample_rate)
+    frame_len = frame_length(sample_rate)
+    
+    # Cut in the middle of every pause that is long enough
+    silence_starts, silence_ends = runs(~flags)
+    long_enough = (silence_ends - silence_starts) * FRAME_MS >= min_silence_ms
+    cut_points = ((silence_starts[long_enough] + silence_ends[long_enough]) // 2) * frame_len
+    
+    max_chunk = int(max_chunk_seconds * sample_rate)
+    chunks = []
+    start = 0
+    while start < len(samples):
+        limit = start + max_chunk
+        if limit >= len(samples):
+            end = len(samples)
+        else:
+            # Latest pause inside the window, or a hard cut when the speaker never pauses
+            candidates = cut_points[(cut_points > start) & (cut_points <= limit)]
+            end = int(candidates[-1]) if len(candidates) else limit
+        
+        # Skip chunks that contain no speech at all
+        first_frame, last_frame = start // frame_len, max(start // frame_len + 1, end // frame_len)
+        if flags[first_frame:last_frame].any() or len(flags) == 0:
+            chunks.append((start, end))
+        start = end
+    
+    return chunks
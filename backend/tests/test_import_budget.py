@@ -0,0 +1,34 @@
+"""Cold-start budget for the serverless functions in api/ (see bench/import_budget.py)"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench.import_budget import FUNCTIONS, DEFAULT_BUDGET, measure_function
+
+class ImportBudgetTest(unittest.TestCase):
+    """Each function must import within budget, without heavy libraries and without writing files"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.results = {name: measure_function(name) for name in FUNCTIONS}
+    
+    def test_import_time(self):
+        for name, result in self.results.items():
+            with self.subTest(function=name):
+                self.assertLessEqual(result['seconds'], DEFAULT_BUDGET,
+                                     f"api/{name}.py took {result['seconds'] * 1000:.0f} ms to import")
+    
+    def test_no_eager_heavy_imports(self):
+        for name, result in self.results.items():
+            with self.subTest(function=name):
+                self.assertEqual(result['loaded'], [], f"api/{name}.py imports heavy modules at cold start")
+    
+    def test_no_files_written(self):
+        for name, result in self.results.items():
+            with self.subTest(function=name):
+                self.assertEqual(result['created'], [], f"api/{name}.py writes files at cold start")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import io
+import os
+import hashlib
+import tempfile
+from flask import Request
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+class HashingSpooledFile:
+    """Spooled buffer that hashes the bytes as the request body is streamed into it"""
+    
+    def __init__(self, max_size):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self.digest = hashlib.sha256()
+        self.size = 0
+    
+    def write(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+    
+    @property
+    def sha256(self):
+        return self.digest.hexdigest()
+    
+    def __getattr__(self, name):
+        # read, seek, tell, close, ... go straight to the spooled file
+        return getattr(self.file, name)
+
+class UploadRequest(Request):
+    """Request class that parses multipart files into hashing spooled buffers"""
+    
+    # Files below this size stay in memory, larger ones roll over to one temp file
+    spool_threshold = int(os.getenv('UPLOAD_SPOOL_THRESHOLD', str(8 * 1024 * 1024)))
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpooledFile(self.spool_threshold)
+
+class Upload:
+    """An uploaded file handed to the analyzers without saving it to disk first"""
+    
+    def __init__(self, file_storage):
+        self.filename = secure_filename(file_storage.filename or '')
+        self.extension = self.filename.rsplit('.', 1)[1].lower() if '.' in self.filename else None
+        self.stream = file_storage.stream
+        self._path = None
+        
+        # Take ownership so the buffer outlives the request for background jobs
+        file_storage.stream = io.BytesIO()
+        
+        if isinstance(self.stream, HashingSpooledFile):
+            self.sha256 = self.stream.sha256
+            self.size = self.stream.size
+        else:
+            # Bodies parsed by another request class are hashed in one extra pass
+            digest = hashlib.sha256()
+            self.stream.seek(0)
+            for chunk in iter(lambda: self.stream.read(1024 * 1024), b''):
+                digest.update(chunk)
+            self.sha256 = digest.hexdigest()
+            self.size = self.stream.tell()
+    
+    def open(self):
+        """The underlying buffer, rewound to the start"""
+        self.stream.seek(0)
+        return self.stream
+    
+    def path(self):
+        """Materialize to a named temp file for decoders that need a real path"""
+        if self._path is None:
+            suffix = f'.{self.extension}' if self.extension else ''
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+                stream = self.open()
+                for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                    tmp_file.write(chunk)
+                self._path = tmp_file.name
+        return self._path
+    
+    def close(self):
+        """Release the buffer and any materialized file; safe to call more than once"""
+        try:
+            self.stream.close()
+        finally:
+            if self._path and os.path.exists(self._path):
+                os.remove(self._path)
+            self._path = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def spool_upload(chunks, filename, max_size=None):
+    """Upload built from byte chunks (an archive member, a download) instead of a request body"""
+    buffer = HashingSpooledFile(UploadRequest.spool_threshold)
+    try:
+        for chunk in chunks:
+            buffer.write(chunk)
+            if max_size is not None and buffer.size > max_size:
+                raise ValueError(f'{filename} is larger than {max_size} bytes')
+    except Exception:
+        buffer.close()
+        raise
+    return Upload(FileStorage(stream=buffer, filename=filename))